@@ -101,6 +101,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Set MEMCACHED_LOCATION to share cached responses and invalidation counters
+# between worker processes (pymemcache). The local-memory default only suits a
+# single process: each worker keeps its own cache, so recipe responses are
+# neither cached nor sent with ETag or Last-Modified validators, and
+# `recipe_cache_stats` has no counters to report.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if config('MEMCACHED_LOCATION', default=''):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': config('MEMCACHED_LOCATION'),
+    }
+
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = 300  # in seconds
+RECIPE_BATCH_MAX_IDS = 100
+
+# Queue likes in memory and write them in bulk, for promotional traffic.
+RECIPE_LIKE_BUFFER = {
+    'ENABLED': config('RECIPE_LIKE_BUFFER', default=False, cast=bool),
+    'INTERVAL': 1.0,  # in seconds
+    'MAX_PENDING': 1000,
+}
+
+# Thread pool behind the async recipe reads; keep WORKERS within the
+# database connection limit.
+RECIPE_ASYNC_READS = {
+    'WORKERS': config('RECIPE_ASYNC_READ_WORKERS', default=16, cast=int),
+    'MAX_CONCURRENCY': 64,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -135,7 +173,7 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
@@ -153,7 +191,17 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+DEFAULT_FILE_STORAGE = config(
+    'DEFAULT_FILE_STORAGE', default='cloudinary_storage.storage.MediaCloudinaryStorage')
+
+# Uploaded pictures and avatars are staged locally and resized, re-encoded
+# and pushed to DEFAULT_FILE_STORAGE by a background worker pool.
+IMAGE_STAGING_ROOT = os.path.join(MEDIA_ROOT, 'staging')
+IMAGE_PIPELINE = {
+    'WORKERS': config('IMAGE_PIPELINE_WORKERS', default=2, cast=int),
+    'SIZES': {'thumb': 320, 'medium': 800, 'large': 1600},
+    'QUALITY': 82,
+}
 
 # Cloudinary configs
 CLOUDINARY_STORAGE = {
@@ -168,6 +216,20 @@ APPEND_SLASH = False
 
 AUTH_USER_MODEL = 'users.CustomUser'
 CORS_ORIGIN_ALLOW_ALL = True
+# Bounded pool hashing passwords for the async login, registration and
+# password change views; they answer 503 once QUEUE_DEPTH hashes wait.
+PASSWORD_HASHING_EXECUTOR = {
+    'WORKERS': config('PASSWORD_HASHING_WORKERS', default=4, cast=int),
+    'QUEUE_DEPTH': config('PASSWORD_HASHING_QUEUE_DEPTH', default=32, cast=int),
+}
+
+# Users resolved from access tokens are cached; set ALIAS to a cache shared
+# by all processes so invalidation reaches every one of them.
+JWT_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,  # in seconds
+    'ALIAS': config('JWT_USER_CACHE_ALIAS', default=None),
+}
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=15),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=14),
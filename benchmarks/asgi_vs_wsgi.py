@@ -0,0 +1,82 @@
+"""
+Compare the sync recipe reads under WSGI with the async ones under ASGI.
+
+Start both servers against the same database, then point the script at
+them:
+
+    gunicorn bangla_recipe.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn bangla_recipe.asgi:application --workers 4 --port 8001
+    python -m benchmarks.asgi_vs_wsgi --wsgi http://127.0.0.1:8000 \\
+        --asgi http://127.0.0.1:8001 --recipe-id 1
+
+Each target is hit by `--concurrency` threads for `--duration` seconds;
+the report has throughput and latency percentiles per endpoint.
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from .harness import request, summarize, write_report
+
+ENDPOINTS = {
+    'wsgi': {
+        'list': '/api/recipe/?page_size=20',
+        'detail': '/api/recipe/%(recipe_id)s/',
+    },
+    'asgi': {
+        'list': '/api/recipe/async/?page_size=20',
+        'detail': '/api/recipe/async/%(recipe_id)s/',
+    },
+}
+
+
+def load(url, concurrency, duration, headers):
+    samples, statuses, lock = [], Counter(), threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < deadline:
+            status, seconds = request(url, headers=headers)
+            with lock:
+                samples.append(seconds)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {
+        **summarize(samples),
+        'throughput': round(len(samples) / elapsed, 1),
+        'statuses': dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8000')
+    parser.add_argument('--asgi', default='http://127.0.0.1:8001')
+    parser.add_argument('--recipe-id', type=int, default=1)
+    parser.add_argument('--token', help='Access token, to include viewer state.')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--output')
+    options = parser.parse_args()
+
+    headers = {'Authorization': 'Bearer %s' % options.token} if options.token else {}
+    bases = {'wsgi': options.wsgi, 'asgi': options.asgi}
+    report = {'concurrency': options.concurrency, 'duration': options.duration}
+    for target, endpoints in ENDPOINTS.items():
+        for name, path in endpoints.items():
+            url = bases[target].rstrip('/') + path % {'recipe_id': options.recipe_id}
+            report['%s.%s' % (target, name)] = load(
+                url, options.concurrency, options.duration, headers)
+    write_report(report, options.output)
+
+
+if __name__ == '__main__':
+    main()
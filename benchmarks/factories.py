@@ -0,0 +1,44 @@
+"""
+factory_boy factories for benchmark data. They are only ever `build()`
+and inserted with bulk_create, since saving one row at a time would take
+hours at benchmark volumes.
+"""
+import factory
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from recipe.models import Recipe, RecipeCategory
+
+# One hash for every seeded account; hashing each would dominate seeding.
+PASSWORD = 'bench-pass-1234'
+PASSWORD_HASH = make_password(PASSWORD, salt='benchmark')
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = get_user_model()
+
+    username = factory.Sequence(lambda n: 'bench%d' % n)
+    email = factory.LazyAttribute(lambda user: '%s@example.com' % user.username)
+    first_name = factory.Faker('first_name')
+    last_name = factory.Faker('last_name')
+    password = PASSWORD_HASH
+
+
+class RecipeCategoryFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = RecipeCategory
+
+    name = factory.Sequence(lambda n: 'Category %d' % n)
+
+
+class RecipeFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Recipe
+
+    title = factory.Faker('sentence', nb_words=4)
+    desc = factory.Faker('text', max_nb_chars=200)  # Recipe.desc is max_length=200
+    cook_time = factory.Faker('time_object')
+    ingredients = factory.Faker('text', max_nb_chars=300)
+    procedure = factory.Faker('paragraph', nb_sentences=8)
+    picture = 'recipe/benchmark.jpg'
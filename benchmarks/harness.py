@@ -0,0 +1,61 @@
+"""
+Small timing helpers shared by the benchmark scripts. Standard library
+only, so they run against any deployed server.
+"""
+import json
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Latency summary, in milliseconds, of a list of durations in seconds.
+    """
+    return {
+        'count': len(samples),
+        'p50': _ms(percentile(samples, 0.50)),
+        'p95': _ms(percentile(samples, 0.95)),
+        'p99': _ms(percentile(samples, 0.99)),
+        'max': _ms(max(samples) if samples else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def request(url, data=None, method=None, headers=None, timeout=30):
+    """
+    Send one request and return `(status, seconds)`; HTTP errors count as
+    responses, connection errors as status 0.
+    """
+    body = json.dumps(data).encode() if data is not None else None
+    headers = {'Content-Type': 'application/json', **(headers or {})}
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(
+                url, data=body, method=method, headers=headers), timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as output:
+            output.write(text + '\n')
+    print(text)
@@ -0,0 +1,89 @@
+"""
+Measure how a login storm affects endpoints that do no hashing.
+
+Runs a steady probe against a read endpoint, first alone, then while a
+pool of threads hammers a login endpoint, for the sync and the async
+login in turn:
+
+    python -m benchmarks.login_storm --base-url http://127.0.0.1:8000 \\
+        --email storm@example.com --password secret
+
+Serve the ASGI app (`uvicorn bangla_recipe.asgi:application`) so the async
+views run on the event loop; under WSGI they fall back to a thread each.
+The login account must exist; failed logins hash just the same.
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from .harness import request, summarize, write_report
+
+LOGIN_PATHS = {
+    'sync': '/api/user/login/',
+    'async': '/api/user/async/login/',
+}
+
+
+def probe(url, duration, interval):
+    samples, statuses = [], Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        status, seconds = request(url)
+        samples.append(seconds)
+        statuses[status] += 1
+        time.sleep(interval)
+    return samples, statuses
+
+
+def storm(url, credentials, stop, statuses, lock):
+    while not stop.is_set():
+        status, _ = request(url, credentials)
+        with lock:
+            statuses[status] += 1
+
+
+def run(base_url, probe_path, credentials, concurrency, duration, interval):
+    probe_url = base_url + probe_path
+    samples, statuses = probe(probe_url, duration, interval)
+    report = {'baseline': {**summarize(samples), 'statuses': dict(statuses)}}
+
+    for name, path in LOGIN_PATHS.items():
+        stop, lock, login_statuses = threading.Event(), threading.Lock(), Counter()
+        threads = [threading.Thread(target=storm, daemon=True,
+                                    args=(base_url + path, credentials, stop,
+                                          login_statuses, lock))
+                   for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        samples, statuses = probe(probe_url, duration, interval)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        report[name] = {
+            **summarize(samples),
+            'statuses': dict(statuses),
+            'logins': dict(login_statuses),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--probe-path', default='/api/recipe/trending/')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--output')
+    options = parser.parse_args()
+    report = run(options.base_url.rstrip('/'), options.probe_path,
+                 {'email': options.email, 'password': options.password},
+                 options.concurrency, options.duration, options.interval)
+    write_report(report, options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Measure the main endpoints against a seeded benchmark database:
+
+    python -m benchmarks.seed --recipes 10000 --likes 100000
+    python -m benchmarks.run --output before.json
+    ... change something ...
+    python -m benchmarks.run --output after.json --baseline before.json
+
+Requests go through Django's test client in this process, so the numbers
+cover the view, serializers and queries but not a web server. Each
+endpoint reports p50/p95/p99 latency, queries per request and the peak
+memory allocated by a single request. With `--baseline`, the report
+also carries the change against an earlier report.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from recipe.models import Recipe, RecipeBookmark, RecipeLike  # noqa: E402
+
+from .harness import summarize, write_report  # noqa: E402
+from .seed import zipf_weights  # noqa: E402
+
+User = get_user_model()
+
+# Metrics compared against a baseline; all of them are better lower.
+COMPARED = ('p50', 'p95', 'p99', 'queries_mean', 'peak_memory_kb')
+
+
+class Dataset:
+    """
+    Ids the scenarios draw from, with recipes picked by popularity like
+    real traffic.
+    """
+
+    def __init__(self, rng, skew, token_users=50):
+        self.rng = rng
+        self.recipe_ids = list(Recipe.objects.order_by('-like_count', 'id')
+                               .values_list('id', flat=True))
+        if not self.recipe_ids:
+            raise SystemExit('The benchmark database is empty; run benchmarks.seed first.')
+        self.weights = zipf_weights(len(self.recipe_ids), skew)
+        self.user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        self.power_user_id = (RecipeBookmark.objects.values('user_id').annotate(n=Count('id'))
+                              .order_by('-n').values_list('user_id', flat=True).first()
+                              or self.user_ids[0])
+        users = User.objects.in_bulk(rng.sample(self.user_ids, min(token_users, len(self.user_ids)))
+                                     + [self.power_user_id])
+        self.tokens = {user_id: 'Bearer %s' % RefreshToken.for_user(user).access_token
+                       for user_id, user in users.items()}
+        self.token_user_ids = sorted(self.tokens)
+
+    def recipe(self):
+        return self.rng.choices(self.recipe_ids, cum_weights=self.weights)[0]
+
+    def user(self):
+        return self.rng.choice(self.token_user_ids)
+
+    def volumes(self):
+        return {
+            'users': len(self.user_ids),
+            'recipes': len(self.recipe_ids),
+            'likes': RecipeLike.objects.count(),
+            'bookmarks': RecipeBookmark.objects.count(),
+            'power_user_bookmarks': RecipeBookmark.objects.filter(
+                user_id=self.power_user_id).count(),
+        }
+
+
+# A scenario returns `(method, path, data, headers, cleanup)`; the cleanup
+# runs untimed and undoes writes so every run sees the seeded state.
+
+def recipe_list(data):
+    return 'get', reverse('recipe:recipe-list'), {'page_size': 20}, {}, None
+
+
+def recipe_detail(data):
+    return ('get', reverse('recipe:recipe-detail', args=[data.recipe()]), None,
+            {'HTTP_AUTHORIZATION': data.tokens[data.user()]}, None)
+
+
+def recipe_like(data):
+    user_id, recipe_id = data.user(), data.recipe()
+    url = reverse('recipe:recipe-like', args=[recipe_id])
+    headers = {'HTTP_AUTHORIZATION': data.tokens[user_id]}
+    cleanup = None
+    if not RecipeLike.objects.filter(user_id=user_id, recipe_id=recipe_id).exists():
+        def cleanup(client):
+            client.delete(url, **headers)
+    return 'put', url, None, headers, cleanup
+
+
+def user_bookmarks(data):
+    user_id = data.power_user_id
+    return ('get', reverse('users:user-bookmark', args=[user_id]), {'page_size': 20},
+            {'HTTP_AUTHORIZATION': data.tokens[user_id]}, None)
+
+
+def user_bookmarks_add(data):
+    user_id, recipe_id = data.power_user_id, data.recipe()
+    url = reverse('users:user-bookmark', args=[user_id])
+    headers = {'HTTP_AUTHORIZATION': data.tokens[user_id]}
+    cleanup = None
+    if not RecipeBookmark.objects.filter(user_id=user_id, recipe_id=recipe_id).exists():
+        def cleanup(client):
+            client.delete(url, {'ids': [recipe_id]}, content_type='application/json', **headers)
+    return 'post', url, {'ids': [recipe_id]}, headers, cleanup
+
+
+SCENARIOS = {
+    'recipe_list': recipe_list,
+    'recipe_detail': recipe_detail,
+    'recipe_like': recipe_like,
+    'user_bookmarks': user_bookmarks,
+    'user_bookmarks_add': user_bookmarks_add,
+}
+
+
+def send(client, method, path, data, headers):
+    if method == 'get':
+        return client.get(path, data, **headers)
+    return getattr(client, method)(path, data, content_type='application/json', **headers)
+
+
+def measure(client, scenario, data, requests, warmup, memory_requests):
+    for _ in range(warmup):
+        *request, cleanup = scenario(data)
+        send(client, *request)
+        if cleanup:
+            cleanup(client)
+
+    samples, queries, statuses = [], [], Counter()
+    for _ in range(requests):
+        *request, cleanup = scenario(data)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(client, *request)
+            samples.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        statuses[response.status_code] += 1
+        if cleanup:
+            cleanup(client)
+
+    # Separate pass: tracing allocations slows every request down.
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_requests):
+            *request, cleanup = scenario(data)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            send(client, *request)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+            if cleanup:
+                cleanup(client)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        **summarize(samples),
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries, default=None),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def compare(report, baseline):
+    """
+    Change of each compared metric against the baseline, in percent.
+    """
+    diff = {}
+    for name, after in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        diff[name] = {}
+        for metric in COMPARED:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = round((new - old) / old * 100, 1) if old else None
+            diff[name][metric] = {'before': old, 'after': new, 'change_pct': change}
+    return diff
+
+
+def print_diff(diff, stream):
+    for name, metrics in diff.items():
+        stream.write('%s\n' % name)
+        for metric, values in metrics.items():
+            change = values['change_pct']
+            stream.write('  %-15s %10s -> %-10s %s\n' % (
+                metric, values['before'], values['after'],
+                'n/a' if change is None else '%+.1f%%' % change))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoints', nargs='+', choices=sorted(SCENARIOS),
+                        default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=300,
+                        help='Timed requests per endpoint.')
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--memory-requests', type=int, default=30,
+                        help='Requests traced for peak memory per endpoint.')
+    parser.add_argument('--skew', type=float, default=1.1,
+                        help='Zipf exponent used to pick recipes.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the request sequence.')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='Serve GETs through the response cache.')
+    parser.add_argument('--output', help='Write the JSON report here as well.')
+    parser.add_argument('--baseline', help='Earlier report to compare against.')
+    parser.add_argument('--max-regression', type=float,
+                        help='Exit with status 1 when any p95 grows by more percent.')
+    options = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    data = Dataset(rng, options.skew)
+    client = Client()
+    # A zero timeout expires cached responses at once, so without the flag
+    # the numbers measure the views rather than the cache.
+    overrides = {} if options.response_cache else {'RECIPE_CACHE_TIMEOUT': 0}
+
+    report = {
+        'meta': {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'volumes': data.volumes(),
+            'seed': options.seed,
+            'skew': options.skew,
+            'requests': options.requests,
+            'response_cache': options.response_cache,
+        },
+        'endpoints': {},
+    }
+    with override_settings(**overrides):
+        for name in options.endpoints:
+            print('Measuring %s' % name, file=sys.stderr)
+            result = report['endpoints'][name] = measure(
+                client, SCENARIOS[name], data, options.requests, options.warmup,
+                options.memory_requests)
+            failed = {code: count for code, count in result['statuses'].items()
+                      if not code.startswith('2')}
+            if failed:
+                print('  non-2xx responses: %s' % failed, file=sys.stderr)
+
+    regressed = False
+    if options.baseline:
+        with open(options.baseline) as handle:
+            report['diff'] = compare(report, json.load(handle))
+        print_diff(report['diff'], sys.stderr)
+        if options.max_regression is not None:
+            regressed = any(
+                (metrics.get('p95', {}).get('change_pct') or 0) > options.max_regression
+                for metrics in report['diff'].values())
+    write_report(report, options.output)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
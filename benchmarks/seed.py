@@ -0,0 +1,149 @@
+"""
+Seed a benchmark database with reproducible data:
+
+    python -m benchmarks.seed --recipes 10000 --users 2000 --likes 100000
+
+The same `--seed` and volumes always produce the same rows. Like and
+bookmark targets follow a Zipf-like distribution (`--skew`), so a few
+recipes are very popular and most barely noticed. The first user is a
+power user with `--power-user-bookmarks` bookmarks.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import factory.random  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from recipe.models import Recipe, RecipeBookmark, RecipeCategory, RecipeLike  # noqa: E402
+from users.models import Profile  # noqa: E402
+
+from .factories import RecipeCategoryFactory, RecipeFactory, UserFactory  # noqa: E402
+
+User = get_user_model()
+
+def zipf_weights(count, skew):
+    """
+    Cumulative weights with the i-th item 1 / (i + 1) ** skew as likely.
+    """
+    total, cumulative = 0.0, []
+    for rank in range(count):
+        total += 1 / (rank + 1) ** skew
+        cumulative.append(total)
+    return cumulative
+
+
+def skewed_pairs(rng, user_ids, recipe_ids, count, skew):
+    """
+    `count` distinct (user, recipe) pairs, recipes drawn by popularity.
+    """
+    popularity = list(recipe_ids)
+    rng.shuffle(popularity)
+    weights = zipf_weights(len(popularity), skew)
+    count = min(count, len(user_ids) * len(recipe_ids))
+    pairs = set()
+    while len(pairs) < count:
+        needed = count - len(pairs)
+        recipes = rng.choices(popularity, cum_weights=weights, k=needed)
+        pairs.update((rng.choice(user_ids), recipe_id) for recipe_id in recipes)
+    return sorted(pairs)
+
+
+def insert(model, objects, batch_size):
+    for start in range(0, len(objects), batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(objects[start:start + batch_size], ignore_conflicts=True)
+
+
+def seed(users, recipes, categories, likes, bookmarks, power_user_bookmarks,
+         skew, seed_value, batch_size, log):
+    rng = random.Random(seed_value)
+    factory.random.reseed_random(seed_value)
+    started = time.monotonic()
+
+    insert(User, UserFactory.build_batch(users), batch_size)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    insert(Profile, [Profile(user_id=user_id) for user_id in user_ids], batch_size)
+    log('%d users' % len(user_ids))
+
+    insert(RecipeCategory, RecipeCategoryFactory.build_batch(categories), batch_size)
+    category_ids = list(RecipeCategory.objects.values_list('id', flat=True))
+    for start in range(0, recipes, batch_size):
+        size = min(batch_size, recipes - start)
+        insert(Recipe, [RecipeFactory.build(author_id=rng.choice(user_ids),
+                                            category_id=rng.choice(category_ids))
+                        for _ in range(size)], batch_size)
+    recipe_ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    log('%d recipes' % len(recipe_ids))
+
+    insert(RecipeLike, [RecipeLike(user_id=user_id, recipe_id=recipe_id) for user_id, recipe_id
+                        in skewed_pairs(rng, user_ids, recipe_ids, likes, skew)], batch_size)
+    pairs = skewed_pairs(rng, user_ids, recipe_ids, bookmarks, skew)
+    power_user = user_ids[0]
+    pairs += [(power_user, recipe_id) for recipe_id
+              in rng.sample(recipe_ids, min(power_user_bookmarks, len(recipe_ids)))]
+    insert(RecipeBookmark, [RecipeBookmark(user_id=user_id, recipe_id=recipe_id)
+                            for user_id, recipe_id in pairs], batch_size)
+    like_count, bookmark_count = RecipeLike.objects.count(), RecipeBookmark.objects.count()
+    log('%d likes, %d bookmarks' % (like_count, bookmark_count))
+
+    # bulk_create skips the signals that maintain the counters.
+    call_command('reconcile_recipe_counters', stdout=open(os.devnull, 'w'))
+    log('Seeded in %.1fs' % (time.monotonic() - started))
+    return {
+        'seed': seed_value,
+        'users': len(user_ids),
+        'recipes': len(recipe_ids),
+        'categories': len(category_ids),
+        'likes': like_count,
+        'bookmarks': bookmark_count,
+        'power_user_bookmarks': power_user_bookmarks,
+        'skew': skew,
+        'power_user_id': power_user,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--likes', type=int, default=50000)
+    parser.add_argument('--bookmarks', type=int, default=10000)
+    parser.add_argument('--power-user-bookmarks', type=int, default=2000)
+    parser.add_argument('--skew', type=float, default=1.1,
+                        help='Zipf exponent of recipe popularity; 0 is uniform.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--flush', action='store_true',
+                        help='Delete existing data first.')
+    options = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    call_command('migrate', verbosity=0)
+    if Recipe.objects.exists() or User.objects.exists():
+        if not options.flush:
+            parser.error('The benchmark database already has data; pass --flush.')
+        call_command('flush', interactive=False, verbosity=0)
+
+    meta = seed(options.users, options.recipes, options.categories, options.likes,
+                options.bookmarks, options.power_user_bookmarks, options.skew,
+                options.seed, options.batch_size, log)
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Settings for benchmark runs: the production settings with a local SQLite
+file, or a separate MySQL database when BENCH_DB_ENGINE=mysql. Secrets
+the benchmarks never use get placeholders.
+"""
+import os
+
+for name in ('SECRET_KEY', 'DB_NAME', 'DB_USERNAME', 'DB_PASSWORD', 'DB_HOSTNAME',
+             'CLOUD_NAME', 'API_KEY', 'API_SECRET'):
+    os.environ.setdefault(name, 'benchmark')
+os.environ.setdefault('DB_PORT', '3306')
+# Local files, so picture URLs cost the same on every machine.
+os.environ.setdefault('DEFAULT_FILE_STORAGE', 'django.core.files.storage.FileSystemStorage')
+
+from bangla_recipe.settings import *  # noqa: E402,F401,F403
+from bangla_recipe.settings import BASE_DIR, DATABASES  # noqa: E402
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+if os.environ.get('BENCH_DB_ENGINE') == 'mysql':
+    DATABASES['default']['NAME'] = os.environ.get('BENCH_DB_NAME', 'bangla_recipe_bench')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCH_DB_NAME', str(BASE_DIR / 'benchmarks' / 'bench.sqlite3')),
+        }
+    }
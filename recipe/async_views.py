@@ -0,0 +1,203 @@
+"""
+Async read views for the ASGI app.
+
+The body of each view runs in one call on a bounded pool of threads, so a
+request waiting on the database holds a coroutine instead of a worker,
+and connection upkeep happens once per request. Responses carry the same
+ETag and Last-Modified validators as the sync views.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from users.authentication import CachedJWTAuthentication
+from . import cache as response_cache
+from . import likebuffer
+from .models import Recipe, RecipeBookmark, RecipeLike
+from .pagination import RecipeCursorPagination
+from .serializers import RecipeSerializer
+from .views import recipe_detail_scopes, recipe_list_scopes
+
+User = get_user_model()
+
+DEFAULTS = {
+    'WORKERS': 16,
+    # Database calls in flight per event loop; the rest wait their turn.
+    'MAX_CONCURRENCY': 64,
+}
+
+
+def with_connection(func, *args):
+    # Pool threads outlive requests; recycle connections as a request would,
+    # so run a request's whole body in one call.
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+class ReadExecutor:
+    """
+    Thread pool for blocking reads, limited to `max_concurrency` calls per
+    event loop so a burst queues on the loop rather than in the pool.
+    """
+
+    def __init__(self, workers, max_concurrency):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recipe-reads')
+        self.max_concurrency = max_concurrency
+        self.limits = weakref.WeakKeyDictionary()
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        limit = self.limits.get(loop)
+        if limit is None:
+            limit = self.limits[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with limit:
+            return await loop.run_in_executor(self.executor, partial(with_connection, func, *args))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_read_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = {**DEFAULTS, **getattr(settings, 'RECIPE_ASYNC_READS', {})}
+            _executor = ReadExecutor(config['WORKERS'], config['MAX_CONCURRENCY'])
+        return _executor
+
+
+def cached_data(request, scopes, build):
+    """
+    Return `(status, data)` from `build()`, through the response cache the
+    sync views use.
+    """
+    if not response_cache.is_shared(response_cache.get_cache_alias()):
+        return build()
+    cache = response_cache.get_cache()
+    key = response_cache.response_key(request, scopes)
+    data = cache.get(key)
+    if data is not None:
+        response_cache.record('hit')
+        return 200, data
+    response_cache.record('miss')
+    status, data = build()
+    if status == 200:
+        cache.set(key, data, getattr(settings, 'RECIPE_CACHE_TIMEOUT', 300))
+    return status, data
+
+
+def list_data(request):
+    author_username = request.query_params.get('author__username')
+    fields = RecipeSerializer.get_requested_fields(request)
+    queryset = Recipe.objects.all()
+    if author_username:
+        author_id = User.objects.filter(username=author_username).values_list(
+            'id', flat=True).first()
+        if author_id is None:
+            return 404, {"message": "User not found."}
+        queryset = queryset.filter(author_id=author_id)
+    queryset = RecipeSerializer.restrict_queryset(queryset, fields)
+
+    paginator = RecipeCursorPagination()
+    if paginator.is_requested(request):
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = RecipeSerializer(page, many=True, fields=fields)
+        return 200, paginator.get_paginated_response(serializer.data).data
+    return 200, RecipeSerializer(queryset, many=True, fields=fields).data
+
+
+def detail_data(request, pk):
+    fields = RecipeSerializer.get_requested_fields(request)
+    queryset = RecipeSerializer.restrict_queryset(Recipe.objects.all(), fields)
+    recipe = queryset.filter(id=pk).first()
+    if recipe is None:
+        return 404, {"detail": "Not found."}
+    return 200, RecipeSerializer(recipe, fields=fields).data
+
+
+def is_liked(user_id, pk):
+    if likebuffer.is_enabled():
+        return likebuffer.get_like_buffer().is_liked(user_id, pk)
+    return RecipeLike.objects.filter(user_id=user_id, recipe_id=pk).exists()
+
+
+def is_bookmarked(user_id, pk):
+    return RecipeBookmark.objects.filter(user_id=user_id, recipe_id=pk).exists()
+
+
+def authenticate(request):
+    """
+    The user of a bearer token, None for anonymous requests, or an error
+    response for a bad token.
+    """
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except APIException as error:
+        detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+        return None, JsonResponse(detail, status=error.status_code)
+    return (authenticated[0] if authenticated else None), None
+
+
+def method_not_allowed():
+    return JsonResponse({"message": "Method not allowed."}, status=405)
+
+
+@response_cache.conditional_response(recipe_list_scopes)
+def list_response(request):
+    status, data = cached_data(request, recipe_list_scopes(request),
+                               partial(list_data, request))
+    return JsonResponse(data, status=status, safe=False)
+
+
+@response_cache.conditional_response(recipe_detail_scopes, per_user=True)
+def detail_response(request, pk):
+    status, data = cached_data(request, recipe_detail_scopes(request, pk),
+                               partial(detail_data, request, pk))
+    user = request.user
+    if status == 200 and user.is_authenticated:
+        # Likes and bookmarks bump the recipe scope and the ETag carries the
+        # user id, so a validator never matches another viewer's state.
+        data = {**data, 'liked': is_liked(user.id, pk),
+                'bookmarked': is_bookmarked(user.id, pk)}
+    return JsonResponse(data, status=status)
+
+
+def authenticated_detail_response(request, pk):
+    user, error = authenticate(request)
+    if error:
+        return error
+    request.user = user or AnonymousUser()
+    return detail_response(request, pk=pk)
+
+
+async def recipe_list(request):
+    """
+    Async `recipe_list`.
+    """
+    if request.method != 'GET':
+        return method_not_allowed()
+    return await get_read_executor().run(list_response, Request(request))
+
+
+async def recipe_detail(request, pk):
+    """
+    Async `recipe_detail`. Authenticated requests also get `liked` and
+    `bookmarked`.
+    """
+    if request.method != 'GET':
+        return method_not_allowed()
+    return await get_read_executor().run(authenticated_detail_response, Request(request), pk)
@@ -0,0 +1,218 @@
+import functools
+import hashlib
+import math
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY = 'recipe:version:%s'
+RESPONSE_KEY = 'recipe:response:%s'
+STATS_KEY = 'recipe:stats:%s'
+
+# Scopes whose version is part of a cache key. Bumping a scope's version
+# orphans every entry built from it, so nothing is ever deleted by pattern.
+CATALOG = 'catalog'  # category names and usernames rendered into every recipe
+LIST = 'list'  # membership and content of the unfiltered recipe list
+
+
+# Backends whose entries live inside a single process.
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared(alias):
+    """
+    Whether every worker process sees the entries of cache `alias`. Only a
+    shared cache can carry invalidations from one process to the others.
+    """
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_BACKENDS
+
+
+def recipe_scope(recipe_id):
+    return 'recipe:%s' % recipe_id
+
+
+def author_scope(username):
+    return 'author:%s' % username
+
+
+def bookmarks_scope(user_id):
+    return 'bookmarks:%s' % user_id
+
+
+def get_cache_alias():
+    return getattr(settings, 'RECIPE_CACHE_ALIAS', 'default')
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def new_version():
+    """
+    A version is a random token plus the time the scope last changed; the
+    token never repeats, even if the entry is evicted and seeded again.
+    """
+    return (uuid.uuid4().hex, time.time())
+
+
+def get_versions(scopes):
+    """
+    Current `(token, modified)` of each scope, in one cache round trip.
+    """
+    cache = get_cache()
+    keys = [VERSION_KEY % scope for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_version(), None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def get_request_versions(request, scopes):
+    """
+    `get_versions` memoized on the request, so the conditional and the
+    response cache layers share one lookup.
+    """
+    memo = request.__dict__.setdefault('_recipe_cache_versions', {})
+    key = tuple(scopes)
+    if key not in memo:
+        memo[key] = get_versions(scopes)
+    return memo[key]
+
+
+def _bump(scopes):
+    cache = get_cache()
+    cache.set_many({VERSION_KEY % scope: new_version() for scope in set(scopes)}, None)
+
+
+def bump(*scopes):
+    """
+    Invalidate every cached response built from the given scopes.
+    """
+    _bump(scopes)
+    # Bump again once the write is visible: a reader that filled the cache
+    # from the pre-commit state in between stored it under a dead version.
+    transaction.on_commit(functools.partial(_bump, scopes))
+
+
+def record(outcome):
+    cache = get_cache()
+    key = STATS_KEY % outcome
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def stats(reset=False):
+    cache = get_cache()
+    keys = {outcome: STATS_KEY % outcome for outcome in ('hit', 'miss')}
+    found = cache.get_many(keys.values())
+    if reset:
+        cache.delete_many(keys.values())
+    return {outcome: found.get(key, 0) for outcome, key in keys.items()}
+
+
+def response_key(request, scopes):
+    params = sorted(request.query_params.lists())
+    tokens = [token for token, _ in get_request_versions(request, scopes)]
+    raw = repr((request.path, params, list(zip(scopes, tokens))))
+    return RESPONSE_KEY % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def cache_response(get_scopes):
+    """
+    Cache the data of successful GET responses of a function view.
+
+    `get_scopes(request, **kwargs)` returns the scopes the response is built
+    from, or None to skip caching. Nothing is cached without a shared cache,
+    where a write in one worker could not invalidate the others.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = None
+            if request.method == 'GET' and is_shared(get_cache_alias()):
+                scopes = get_scopes(request, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = response_key(request, scopes)
+            data = cache.get(key)
+            if data is not None:
+                record('hit')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            record('miss')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data,
+                          getattr(settings, 'RECIPE_CACHE_TIMEOUT', 300))
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_response(get_scopes, per_user=False):
+    """
+    Answer GET/HEAD with strong ETag and Last-Modified headers derived from
+    the scope versions, returning 304 for matching `If-None-Match` or
+    `If-Modified-Since` without running the view or serializing anything.
+
+    `per_user` is for views whose body depends on the viewer: the user id
+    goes into the ETag and the response varies on `Authorization`.
+
+    Needs a shared cache: a process-local one never sees the bumps of other
+    workers and would answer 304 for stale data indefinitely, so responses
+    carry no validators then.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = None
+            if request.method in ('GET', 'HEAD') and is_shared(get_cache_alias()):
+                scopes = get_scopes(request, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+
+            versions = get_request_versions(request, scopes)
+            viewer = request.user.pk if per_user else None
+            raw = repr((request.path, sorted(request.query_params.lists()),
+                        request.META.get('HTTP_ACCEPT', ''),
+                        [token for token, _ in versions], viewer))
+            etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+            # HTTP dates have whole seconds. Rounding up keeps a client's date
+            # from ever covering a later bump, as long as it is only sent once
+            # the second is over and no more bumps can land in it.
+            last_modified = math.ceil(max(modified for _, modified in versions))
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified <= time.time():
+                    response['Last-Modified'] = http_date(last_modified)
+            if per_user:
+                patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
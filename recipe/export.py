@@ -0,0 +1,53 @@
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Recipe
+from .serializers import RecipeSerializer
+
+
+def iter_recipe_chunks(since_id=0, updated_since=None, chunk_size=500):
+    """
+    Yield lists of recipes in id order, seeking past the last id of each
+    chunk so memory and per-chunk query cost stay constant.
+
+    To resume an interrupted export pass the last exported id as `since_id`
+    together with the same `updated_since` watermark.
+    """
+    queryset = Recipe.objects.for_listing().order_by('id')
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gt=updated_since)
+
+    last_id = since_id or 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def iter_ndjson(chunks):
+    """
+    One JSON document per line, shaped like `RecipeSerializer` plus the
+    `updated_at` watermark.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for chunk in chunks:
+        lines = []
+        for recipe, data in zip(chunk, RecipeSerializer(chunk, many=True).data):
+            data['updated_at'] = recipe.updated_at
+            lines.append(encoder.encode(data))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_stream(blocks, level=6):
+    """
+    Compress an iterable of byte blocks into one streaming gzip member.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
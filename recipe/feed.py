@@ -0,0 +1,133 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from scipy import sparse
+
+from .models import FeedCandidate, FeedState, RecipeBookmark, RecipeLike
+from .similar import top
+
+# Strength of each kind of interaction in the user x recipe matrix.
+INTERACTION_WEIGHTS = {
+    'like': 1.0,
+    'bookmark': 2.0,
+}
+
+
+def mark_dirty(user_ids):
+    """
+    Flag the feeds of users whose likes or bookmarks changed.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    now = timezone.now()
+    updated = FeedState.objects.filter(user_id__in=user_ids).update(changed_at=now)
+    if updated < len(user_ids):
+        FeedState.objects.bulk_create(
+            [FeedState(user_id=user_id, changed_at=now) for user_id in user_ids],
+            ignore_conflicts=True)
+
+
+def stale_user_ids():
+    return list(FeedState.objects.filter(
+        Q(computed_at__isnull=True) | Q(changed_at__gt=F('computed_at'))
+    ).values_list('user_id', flat=True))
+
+
+def load_interactions():
+    """
+    Return `(user_ids, recipe_ids, matrix)` with the weighted likes and
+    bookmarks of every user.
+    """
+    sources = (
+        (RecipeLike.objects.values_list('user_id', 'recipe_id'), INTERACTION_WEIGHTS['like']),
+        (RecipeBookmark.objects.values_list('user_id', 'recipe_id'), INTERACTION_WEIGHTS['bookmark']),
+    )
+    user_pos, recipe_pos = {}, {}
+    rows, columns, values = [], [], []
+    for pairs, weight in sources:
+        for user_id, recipe_id in pairs.order_by().iterator():
+            rows.append(user_pos.setdefault(user_id, len(user_pos)))
+            columns.append(recipe_pos.setdefault(recipe_id, len(recipe_pos)))
+            values.append(weight)
+    matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(user_pos), len(recipe_pos)))
+    matrix.sum_duplicates()
+    return list(user_pos), list(recipe_pos), matrix
+
+
+def item_similarity(matrix, neighbours=50):
+    """
+    Cosine-normalized recipe x recipe co-occurrence, keeping only the
+    `neighbours` strongest entries of each row so the model stays sparse.
+    """
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    norms = np.sqrt(cooccurrence.diagonal())
+    norms[norms == 0] = 1
+    scaling = sparse.diags(1 / norms)
+    cooccurrence = (scaling @ cooccurrence @ scaling).tocsr()
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+
+    rows, columns, values = [], [], []
+    for row in range(cooccurrence.shape[0]):
+        begin, end = cooccurrence.indptr[row], cooccurrence.indptr[row + 1]
+        for column, value in top(cooccurrence.indices[begin:end],
+                                 cooccurrence.data[begin:end], neighbours):
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+    return sparse.csr_matrix((values, (rows, columns)), shape=cooccurrence.shape)
+
+
+def build_feeds(full=False, limit=200, block_size=1000):
+    """
+    Rebuild the candidate lists of users whose interactions changed, or of
+    every user with `full`. Returns the number of feeds written.
+
+    A user's candidates are the recipes co-liked or co-bookmarked with what
+    they interacted with, scored by the item-item model and excluding
+    recipes they already liked or bookmarked.
+    """
+    started = timezone.now()
+    user_ids, recipe_ids, matrix = load_interactions()
+    user_pos = {user_id: row for row, user_id in enumerate(user_ids)}
+    if full:
+        targets = set(user_ids) | set(FeedState.objects.values_list('user_id', flat=True))
+    else:
+        targets = set(stale_user_ids())
+    targets = sorted(targets)
+    similarity = item_similarity(matrix) if matrix.shape[0] else None
+
+    for start in range(0, len(targets), block_size):
+        block = targets[start:start + block_size]
+        rows = [user_pos[user_id] for user_id in block if user_id in user_pos]
+        feeds = {user_id: [] for user_id in block}
+        if rows:
+            scores = (matrix[rows] @ similarity).tocsr()
+            for offset, row in enumerate(rows):
+                begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+                columns, values = scores.indices[begin:end], scores.data[begin:end]
+                seen = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+                keep = ~np.isin(columns, seen) & (values > 0)
+                feeds[user_ids[row]] = [(recipe_ids[column], score) for column, score
+                                        in top(columns[keep], values[keep], limit)]
+        write_feeds(feeds, started)
+    return len(targets)
+
+
+def write_feeds(feeds, computed_at):
+    """
+    Replace the candidates of the users in `feeds` and mark them built as
+    of `computed_at`; interactions after it leave the feed stale.
+    """
+    with transaction.atomic():
+        FeedCandidate.objects.filter(user_id__in=feeds).delete()
+        FeedCandidate.objects.bulk_create([
+            FeedCandidate(user_id=user_id, recipe_id=recipe_id, score=score, rank=rank)
+            for user_id, candidates in feeds.items()
+            for rank, (recipe_id, score) in enumerate(candidates)])
+        FeedState.objects.bulk_create(
+            [FeedState(user_id=user_id, changed_at=computed_at) for user_id in feeds],
+            ignore_conflicts=True)
+        FeedState.objects.filter(user_id__in=feeds).update(computed_at=computed_at)
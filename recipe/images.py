@@ -0,0 +1,199 @@
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+READY = 'ready'
+FAILED = 'failed'
+STATUS_CHOICES = (
+    (PENDING, 'Pending'),
+    (PROCESSING, 'Processing'),
+    (READY, 'Ready'),
+    (FAILED, 'Failed'),
+)
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'SIZES': {'thumb': 320, 'medium': 800, 'large': 1600},
+    'QUALITY': 82,
+    # Run jobs inline after commit instead of on the worker pool (tests).
+    'EAGER': False,
+}
+ENCODINGS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+# Sent after a job finishes, successfully or not, so readers can invalidate.
+image_processed = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_PIPELINE', {})}
+
+
+def get_staging_root():
+    return getattr(settings, 'IMAGE_STAGING_ROOT',
+                   os.path.join(settings.MEDIA_ROOT, 'staging'))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_config()['WORKERS'],
+                                           thread_name_prefix='image-pipeline')
+        return _executor
+
+
+def stage_upload(upload, prefix=''):
+    """
+    Copy an upload to the local staging area and return its path; the
+    request no longer waits on the remote storage.
+    """
+    root = get_staging_root()
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, '%s%s%s' % (
+        prefix, uuid.uuid4().hex, os.path.splitext(upload.name)[1]))
+    with open(path, 'wb') as staged:
+        for chunk in upload.chunks():
+            staged.write(chunk)
+    return path
+
+
+def accept_image(instance, field_name, upload):
+    """
+    Stage `upload` for `instance.<field_name>` and queue its processing
+    once the surrounding transaction commits. The instance must be saved.
+    """
+    # The name leads back to the row, so `resume_pending` can find it.
+    path = stage_upload(upload, '%s-%s-%s-' % (instance._meta.label_lower, instance.pk, field_name))
+    type(instance).objects.filter(pk=instance.pk).update(**{
+        '%s_status' % field_name: PENDING})
+    setattr(instance, '%s_status' % field_name, PENDING)
+    job = (instance._meta.label, instance.pk, field_name, path)
+    if get_config()['EAGER']:
+        transaction.on_commit(lambda: process_image(*job))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, *job))
+
+
+def run_in_worker(*job):
+    # Worker threads keep their own connections; recycle them like requests do.
+    close_old_connections()
+    try:
+        process_image(*job)
+    finally:
+        close_old_connections()
+
+
+def render_variants(image, quality):
+    """
+    Yield `(size, extension, bytes)` for every configured size and format.
+    Re-encoding without passing `exif` drops all metadata.
+    """
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    for size, max_edge in get_config()['SIZES'].items():
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        for extension, pil_format in ENCODINGS:
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=quality, optimize=True)
+            yield size, extension, buffer.getvalue()
+
+
+def process_image(model_label, pk, field_name, path):
+    """
+    Resize, re-encode and upload a staged image, then point the model at
+    the largest JPEG and record every variant.
+    """
+    model = apps.get_model(model_label)
+    status_field = '%s_status' % field_name
+    try:
+        field = model._meta.get_field(field_name)
+        if not model.objects.filter(pk=pk).update(**{status_field: PROCESSING}):
+            # Deleted before the job ran.
+            return
+
+        quality = get_config()['QUALITY']
+        prefix = '%s/%s/%s' % (field.upload_to, pk, uuid.uuid4().hex[:8])
+        variants = {}
+        with Image.open(path) as image:
+            for size, extension, content in render_variants(image, quality):
+                name = field.storage.save('%s-%s.%s' % (prefix, size, extension),
+                                          ContentFile(content))
+                variants.setdefault(size, {})[extension] = name
+
+        largest = list(get_config()['SIZES'])[-1]
+        model.objects.filter(pk=pk).update(**{
+            field_name: variants[largest]['jpg'],
+            '%s_variants' % field_name: variants,
+            status_field: READY,
+        })
+    except Exception:
+        logger.exception('Processing %s of %s %s failed.', field_name, model_label, pk)
+        model.objects.filter(pk=pk).update(**{status_field: FAILED})
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        image_processed.send(sender=model, pk=pk, field_name=field_name)
+
+
+def resume_pending(older_than=600):
+    """
+    Process staged uploads whose job was lost, such as when the process
+    stopped before running it, and whose row is still pending. Superseded
+    uploads and those of rows no longer pending are deleted; files younger
+    than `older_than` seconds may belong to a queued job and are left
+    alone. Returns the number of jobs run.
+    """
+    root = get_staging_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - older_than
+    staged = {}
+    for entry in os.scandir(root):
+        parts = entry.name.split('-', 3)
+        if len(parts) != 4 or not parts[1].isdigit() or entry.stat().st_mtime > cutoff:
+            continue
+        staged.setdefault(tuple(parts[:3]), []).append(entry)
+
+    resumed = 0
+    for (model_label, pk, field_name), entries in staged.items():
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        model = apps.get_model(model_label)
+        status = model.objects.filter(pk=pk).values_list(
+            '%s_status' % field_name, flat=True).first()
+        if status == PENDING:
+            # Only the latest upload counts.
+            process_image(model._meta.label, int(pk), field_name, entries.pop().path)
+            resumed += 1
+        for entry in entries:
+            os.remove(entry.path)
+    return resumed
+
+
+def variant_urls(instance, field_name):
+    """
+    Public URLs of the processed variants, keyed by size and format.
+    """
+    storage = instance._meta.get_field(field_name).storage
+    variants = getattr(instance, '%s_variants' % field_name) or {}
+    return {size: {extension: storage.url(name) for extension, name in names.items()}
+            for size, names in variants.items()}
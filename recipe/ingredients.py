@@ -0,0 +1,181 @@
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+from scipy import sparse
+
+from .models import Ingredient, IngredientIndexVersion, RecipeIngredient
+from .search import normalize_token, tokenize
+
+# Lines, commas, semicolons and the danda separate ingredient entries.
+ENTRY_SEPARATOR_RE = re.compile('[\n,;|।]')
+
+# Quantities, units and preparation words that do not identify an ingredient.
+NOISE_WORDS = {normalize_token(word) for word in (
+    'a', 'an', 'of', 'to', 'as', 'and', 'or', 'for', 'taste', 'needed', 'some',
+    'g', 'gm', 'gram', 'grams', 'kg', 'ml', 'l', 'litre', 'liter', 'lb', 'oz',
+    'cup', 'cups', 'tbsp', 'tsp', 'tablespoon', 'tablespoons', 'teaspoon',
+    'teaspoons', 'pinch', 'piece', 'pieces', 'pcs', 'clove', 'cloves',
+    'small', 'medium', 'large', 'chopped', 'sliced', 'minced', 'paste',
+    'powder', 'fresh', 'whole',
+    'কাপ', 'চামচ', 'টেবিল', 'গ্রাম', 'কেজি', 'লিটার', 'মিলি', 'টি', 'টা', 'পিস',
+    'কোয়া', 'পরিমাণ', 'মতো', 'স্বাদমতো', 'স্বাদ', 'অনুযায়ী', 'আধা', 'পোয়া', 'বড়',
+    'ছোট', 'মাঝারি', 'কুচি', 'বাটা', 'গুঁড়া', 'ফালি', 'আস্ত', 'সামান্য', 'প্রয়োজনমতো',
+)}
+# "চা চামচ" is a teaspoon, while "চা" alone is tea.
+TEA = normalize_token('চা')
+SPOON = normalize_token('চামচ')
+
+
+def parse_ingredient_name(entry):
+    tokens = tokenize(entry)
+    words = []
+    for position, token in enumerate(tokens):
+        if token in NOISE_WORDS or token.isdigit():
+            continue
+        if token == TEA and tokens[position + 1:position + 2] == [SPOON]:
+            continue
+        words.append(token)
+    return ' '.join(words)[:Ingredient._meta.get_field('name').max_length]
+
+
+def parse_ingredients(text):
+    """
+    Turn the free-form ingredients text into normalized ingredient names.
+    """
+    names = []
+    for entry in ENTRY_SEPARATOR_RE.split(text or ''):
+        name = parse_ingredient_name(entry)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_ingredients(names):
+    """
+    Map names to `Ingredient` ids, creating missing vocabulary in bulk.
+    """
+    if not names:
+        return {}
+    existing = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [Ingredient(name=name) for name in names if name not in existing]
+    if missing:
+        Ingredient.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+    return existing
+
+
+def index_recipe_ingredients(recipes):
+    """
+    Replace the parsed ingredient rows of the given recipes.
+    """
+    parsed = {recipe.id: parse_ingredients(recipe.ingredients) for recipe in recipes}
+    with transaction.atomic():
+        ids = resolve_ingredients({name for names in parsed.values() for name in names})
+        RecipeIngredient.objects.filter(recipe_id__in=parsed).delete()
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ids[name])
+            for recipe_id, names in parsed.items() for name in names])
+        invalidate_pantry_index()
+
+
+def invalidate_pantry_index():
+    # The version lives in the database, which every process reads; it
+    # commits together with the ingredient rows it covers.
+    if not IngredientIndexVersion.objects.update(version=F('version') + 1):
+        IngredientIndexVersion.objects.get_or_create(id=1, defaults={'version': 1})
+
+
+def get_pantry_version():
+    return IngredientIndexVersion.objects.values_list('version', flat=True).first()
+
+
+class PantryIndex:
+    """
+    In-memory recipe x ingredient incidence matrix.
+
+    Ranking a pantry is a sparse matrix-vector product, so no recipe text is
+    read while serving a request.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        rows = list(RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'))
+        self.names = dict(Ingredient.objects.values_list('id', 'name'))
+        recipe_ids = sorted({recipe_id for recipe_id, _ in rows})
+        ingredient_ids = sorted(self.names)
+        self.recipe_ids = np.array(recipe_ids, dtype=np.int64)
+        self.ingredient_ids = np.array(ingredient_ids, dtype=np.int64)
+        recipe_pos = {recipe_id: i for i, recipe_id in enumerate(recipe_ids)}
+        self.ingredient_pos = {ingredient_id: i for i, ingredient_id in enumerate(ingredient_ids)}
+
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32),
+             ([recipe_pos[r] for r, _ in rows], [self.ingredient_pos[i] for _, i in rows])),
+            shape=(len(recipe_ids), len(ingredient_ids)))
+        self.sizes = np.diff(self.matrix.indptr)
+
+        # Word -> ingredient ids, so "ilish" also matches "ilish mach".
+        self.by_word = defaultdict(set)
+        for ingredient_id, name in self.names.items():
+            for word in name.split():
+                self.by_word[word].add(ingredient_id)
+
+    def match(self, items):
+        """
+        Ingredient ids covered by the pantry items.
+        """
+        matched = set()
+        for item in items:
+            words = parse_ingredient_name(item).split()
+            if not words:
+                continue
+            candidates = set.intersection(*(self.by_word.get(word, set()) for word in words))
+            matched.update(candidates)
+        return matched
+
+    def rank(self, items, limit=20):
+        """
+        Return `(recipe_id, coverage, missing_names)` best coverage first,
+        then fewest missing ingredients.
+        """
+        matched = self.match(items)
+        if not matched or not self.matrix.shape[0]:
+            return []
+        pantry = np.zeros(self.matrix.shape[1], dtype=np.int32)
+        pantry[[self.ingredient_pos[i] for i in matched if i in self.ingredient_pos]] = 1
+
+        have = self.matrix @ pantry
+        candidates = np.flatnonzero(have)
+        coverage = have[candidates] / self.sizes[candidates]
+        missing = self.sizes[candidates] - have[candidates]
+        order = np.lexsort((self.recipe_ids[candidates], missing, -coverage))[:limit]
+
+        results = []
+        for position in order:
+            row = candidates[position]
+            columns = self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]]
+            missing_names = sorted(self.names[int(self.ingredient_ids[column])]
+                                   for column in columns if pantry[column] == 0)
+            results.append((int(self.recipe_ids[row]), float(coverage[position]), missing_names))
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_pantry_index():
+    """
+    Return the process-wide index, rebuilding it after ingredient changes.
+    """
+    global _index
+    version = get_pantry_version()
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = PantryIndex(version)
+        return _index
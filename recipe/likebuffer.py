@@ -0,0 +1,193 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import feed, trending
+from .models import Recipe, RecipeLike
+from .signals import invalidate_recipes
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Seconds between background flushes; 0 flushes inline at MAX_PENDING.
+    'INTERVAL': 1.0,
+    # Pending (user, recipe) pairs that trigger an early flush.
+    'MAX_PENDING': 1000,
+    'BATCH_SIZE': 1000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RECIPE_LIKE_BUFFER', {})}
+
+
+def is_enabled():
+    return get_config()['ENABLED']
+
+
+class LikeBuffer:
+    """
+    In-process queue of like/unlike events, coalesced per `(user, recipe)`
+    so a burst of taps becomes at most one insert or delete per pair.
+
+    Every entry remembers whether the like was stored when it was queued,
+    so the count delta of each recipe is known without touching the
+    database. Reads add `delta()` to the stored counter.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        # (user_id, recipe_id) -> [liked, stored]
+        self.pending = {}
+        self.deltas = Counter()
+        # The batch being written; still counted until it has committed.
+        self.flushing = {}
+        self.flushing_deltas = Counter()
+
+    def state(self, user_id, recipe_id):
+        """
+        The queued like state of the pair, or None when nothing is queued.
+        """
+        with self.lock:
+            entry = (self.pending.get((user_id, recipe_id))
+                     or self.flushing.get((user_id, recipe_id)))
+            return entry[0] if entry else None
+
+    def is_liked(self, user_id, recipe_id):
+        liked = self.state(user_id, recipe_id)
+        if liked is None:
+            liked = RecipeLike.objects.filter(user_id=user_id, recipe_id=recipe_id).exists()
+        return liked
+
+    def delta(self, recipe_id):
+        with self.lock:
+            return self.deltas[recipe_id] + self.flushing_deltas[recipe_id]
+
+    def submit(self, user_id, recipe_id, liked):
+        """
+        Queue a like or unlike; returns whether it changes the user's state.
+        """
+        stored = None
+        if self.state(user_id, recipe_id) is None:
+            stored = RecipeLike.objects.filter(user_id=user_id, recipe_id=recipe_id).exists()
+
+        key = (user_id, recipe_id)
+        with self.lock:
+            entry = self.pending.get(key) or self.flushing.get(key)
+            if entry is None:
+                entry = [stored, stored]
+            previous = entry[0]
+            self.pending[key] = [liked, entry[1]]
+            self.deltas[recipe_id] += int(liked) - int(previous)
+            full = len(self.pending) >= self.config['MAX_PENDING']
+
+        if full:
+            if self.config['INTERVAL']:
+                self.wakeup.set()
+            else:
+                self.flush()
+        self.start()
+        return liked != previous
+
+    def flush(self):
+        """
+        Write the queued events in bulk and recompute the counters of the
+        recipes they touched. Returns the number of pairs written.
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.pending = self.pending, {}
+                self.flushing_deltas, self.deltas = self.deltas, Counter()
+            batch = self.flushing
+            if not batch:
+                return 0
+
+            try:
+                likes = [RecipeLike(user_id=user_id, recipe_id=recipe_id)
+                         for (user_id, recipe_id), (liked, _) in batch.items() if liked]
+                unlikes = {}
+                for (user_id, recipe_id), (liked, _) in batch.items():
+                    if not liked:
+                        unlikes.setdefault(recipe_id, []).append(user_id)
+                recipe_ids = sorted({recipe_id for _, recipe_id in batch})
+
+                with transaction.atomic():
+                    # Recipes deleted since the event was queued are skipped.
+                    existing = set(Recipe.objects.filter(id__in=recipe_ids).values_list(
+                        'id', flat=True))
+                    RecipeLike.objects.bulk_create(
+                        [like for like in likes if like.recipe_id in existing],
+                        batch_size=self.config['BATCH_SIZE'], ignore_conflicts=True)
+                    # Creation times of deleted likes, to retract their scores.
+                    unliked = {}
+                    for recipe_id, user_ids in unlikes.items():
+                        rows = RecipeLike.objects.filter(recipe_id=recipe_id, user_id__in=user_ids)
+                        unliked[recipe_id] = list(rows.values_list('created', flat=True))
+                        rows._raw_delete(rows.db)
+                    # Count again instead of applying deltas, so events that
+                    # raced with another process cannot leave drift behind.
+                    Recipe.objects.filter(id__in=existing).update(
+                        like_count=Recipe.objects.live_count_expressions()['like_count'])
+            except Exception:
+                # Requeue the batch; events queued meanwhile are newer.
+                with self.lock:
+                    for key, entry in batch.items():
+                        self.pending.setdefault(key, entry)
+                    self.deltas.update(self.flushing_deltas)
+                    self.flushing, self.flushing_deltas = {}, Counter()
+                raise
+
+            with self.lock:
+                deltas = self.flushing_deltas
+                self.flushing, self.flushing_deltas = {}, Counter()
+            invalidate_recipes(sorted(existing))
+            for recipe_id in existing:
+                removed = unliked.get(recipe_id, [])
+                for created in removed:
+                    trending.record(recipe_id, 'like', -1, at=created.timestamp())
+                trending.record(recipe_id, 'like', max(deltas[recipe_id] + len(removed), 0))
+            feed.mark_dirty(user_id for user_id, recipe_id in batch if recipe_id in existing)
+            return len(batch)
+
+    def start(self):
+        if not self.config['INTERVAL'] or self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='like-buffer', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.config['INTERVAL'])
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered likes failed.')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LikeBuffer()
+        return _buffer
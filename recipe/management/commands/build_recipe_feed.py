@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipe.feed import build_feeds
+
+
+class Command(BaseCommand):
+    help = ('Materialize personalized feeds from an item-item co-occurrence model of '
+            'likes and bookmarks. Only users with new interactions are rebuilt '
+            'unless --full is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild the feed of every user.')
+        parser.add_argument('--limit', type=int, default=200,
+                            help='Candidates stored per user.')
+        parser.add_argument('--block-size', type=int, default=1000,
+                            help='Users scored at a time.')
+
+    def handle(self, *args, **options):
+        built = build_feeds(full=options['full'], limit=options['limit'],
+                            block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS('Built %d feeds.' % built))
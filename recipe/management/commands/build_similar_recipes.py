@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipe.similar import update_similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Precompute similar recipes from TF-IDF vectors. Only new and edited '
+            'recipes are recomputed unless --full is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every recipe, refreshing all IDF weights.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Neighbours stored per recipe.')
+        parser.add_argument('--block-size', type=int, default=500,
+                            help='Recipes compared against the catalog at a time.')
+
+    def handle(self, *args, **options):
+        updated = update_similar_recipes(full=options['full'], limit=options['limit'],
+                                         block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS('Updated neighbours of %d recipes.' % updated))
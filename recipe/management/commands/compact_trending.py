@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipe import trending
+
+
+class Command(BaseCommand):
+    help = ('Rescale trending scores to the current time and prune decayed ones. '
+            'Run it at least daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every score from likes, bookmarks and recipes.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            written = trending.rebuild()
+            self.stdout.write(self.style.SUCCESS('Rebuilt %d trending scores.' % written))
+            return
+        pruned = trending.compact()
+        self.stdout.write(self.style.SUCCESS('Compacted trending scores, %d pruned.' % pruned))
@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from recipe.export import gzip_stream, iter_ndjson, iter_recipe_chunks
+
+
+class Command(BaseCommand):
+    help = 'Export the recipe catalog as NDJSON, optionally gzipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='File to write to, "-" for stdout.')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Compress the output with gzip.')
+        parser.add_argument('--since-id', type=int, default=0,
+                            help='Resume after this recipe id.')
+        parser.add_argument('--updated-since',
+                            help='Only export recipes updated after this ISO timestamp.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of recipes read per query.')
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            updated_since = parse_datetime(options['updated_since'])
+            if updated_since is None:
+                raise CommandError('Invalid --updated-since timestamp.')
+
+        progress = {'count': 0, 'last_id': options['since_id']}
+
+        def tracked_chunks():
+            for chunk in iter_recipe_chunks(options['since_id'], updated_since,
+                                            options['chunk_size']):
+                yield chunk
+                progress['count'] += len(chunk)
+                progress['last_id'] = chunk[-1].id
+
+        stream = iter_ndjson(tracked_chunks())
+        if options['gzip']:
+            stream = gzip_stream(stream)
+
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+        else:
+            output = open(options['output'], 'wb')
+        try:
+            for block in stream:
+                output.write(block)
+        finally:
+            output.flush()
+            if output is not sys.stdout.buffer:
+                output.close()
+            self.stderr.write('Exported %d recipes, last id %d.' % (
+                progress['count'], progress['last_id']))
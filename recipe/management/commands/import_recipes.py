@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_time
+
+from recipe import cache as response_cache
+from recipe.ingredients import index_recipe_ingredients
+from recipe.models import Recipe, RecipeCategory
+from recipe.search import index_recipes
+
+User = get_user_model()
+
+TEXT_FIELDS = ('title', 'desc', 'ingredients', 'procedure', 'picture')
+LOOKUP_CHUNK = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Bulk import recipes from CSV or JSONL. Rows need title, desc, '
+            'cook_time, ingredients, procedure, picture, category and author '
+            '(username or email).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Input format; guessed from the extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per transaction.')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last committed row, used to resume.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the file without writing anything.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('File "%s" does not exist.' % path)
+        self.format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.checkpoint = options['checkpoint']
+        start = self.read_checkpoint()
+        if start:
+            self.stdout.write('Resuming after row %d.' % start)
+
+        # First pass: resolve every category and author in bulk up front.
+        categories, authors = set(), set()
+        for _, row in self.read_rows(path, start):
+            categories.add((row.get('category') or '').strip())
+            authors.add((row.get('author') or '').strip())
+        self.category_ids = self.resolve_categories(categories - {''}, options['dry_run'])
+        self.author_ids = self.resolve_authors(authors - {''})
+
+        imported = invalid = 0
+        started = time.monotonic()
+        rows = self.read_rows(path, start)
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+
+            recipes = []
+            for line, row in batch:
+                try:
+                    recipes.append(self.build_recipe(row))
+                except RowError as error:
+                    invalid += 1
+                    self.stderr.write('Row %d skipped: %s' % (line, error))
+
+            if recipes and not options['dry_run']:
+                self.insert(recipes)
+            if not options['dry_run']:
+                self.write_checkpoint(batch[-1][0])
+            imported += len(recipes)
+            elapsed = time.monotonic() - started
+            self.stdout.write('%d rows, %.0f rows/sec' % (
+                imported, imported / elapsed if elapsed else 0))
+
+        verb = 'validated' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(
+            '%d recipes %s, %d rows skipped.' % (imported, verb, invalid)))
+
+    def read_rows(self, path, start=0):
+        """
+        Yield `(row_number, row)` pairs after the `start` row.
+        """
+        with open(path, newline='', encoding='utf-8') as handle:
+            if self.format == 'csv':
+                rows = csv.DictReader(handle)
+            else:
+                rows = (json.loads(line) for line in handle if line.strip())
+            for number, row in enumerate(rows, 1):
+                if number > start:
+                    yield number, row
+
+    def resolve_categories(self, names, dry_run):
+        names = sorted(names)
+        found = {}
+        for chunk in chunked(names, LOOKUP_CHUNK):
+            found.update(RecipeCategory.objects.filter(name__in=chunk).values_list('name', 'id'))
+        missing = [name for name in names if name not in found]
+        if missing and not dry_run:
+            RecipeCategory.objects.bulk_create([RecipeCategory(name=name) for name in missing])
+            for chunk in chunked(missing, LOOKUP_CHUNK):
+                found.update(RecipeCategory.objects.filter(name__in=chunk).values_list('name', 'id'))
+        elif missing:
+            found.update({name: None for name in missing})
+        return found
+
+    def resolve_authors(self, identifiers):
+        found = {}
+        for chunk in chunked(sorted(identifiers), LOOKUP_CHUNK):
+            users = User.objects.filter(Q(username__in=chunk) | Q(email__in=chunk))
+            for user_id, username, email in users.values_list('id', 'username', 'email'):
+                found[username] = user_id
+                found[email] = user_id
+        return found
+
+    def build_recipe(self, row):
+        values = {}
+        for field in TEXT_FIELDS:
+            value = (row.get(field) or '').strip()
+            if not value:
+                raise RowError('"%s" is required.' % field)
+            max_length = Recipe._meta.get_field(field).max_length
+            if max_length and len(value) > max_length:
+                raise RowError('"%s" is longer than %d characters.' % (field, max_length))
+            values[field] = value
+
+        try:
+            cook_time = parse_time((row.get('cook_time') or '').strip())
+        except ValueError:
+            cook_time = None
+        if cook_time is None:
+            raise RowError('"cook_time" must look like HH:MM[:SS].')
+
+        category = (row.get('category') or '').strip()
+        if not category:
+            raise RowError('"category" is required.')
+        author = (row.get('author') or '').strip()
+        if author not in self.author_ids:
+            raise RowError('Unknown author "%s".' % author)
+
+        return Recipe(author_id=self.author_ids[author],
+                      category_id=self.category_ids[category],
+                      cook_time=cook_time, **values)
+
+    def insert(self, recipes):
+        """
+        Insert one batch and index it in the same transaction; bulk_create
+        does not send the signals that normally maintain the indexes.
+        """
+        with transaction.atomic():
+            last_id = Recipe.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            Recipe.objects.bulk_create(recipes)
+            # MySQL does not return the new ids, so read them back.
+            created = list(Recipe.objects.filter(id__gt=last_id).only(
+                'id', 'author', 'title', 'desc', 'ingredients', 'procedure'))
+            index_recipes(created)
+            index_recipe_ingredients(created)
+        author_ids = {recipe.author_id for recipe in created}
+        usernames = User.objects.filter(id__in=author_ids).values_list('username', flat=True)
+        response_cache.bump(response_cache.LIST,
+                            *[response_cache.author_scope(username) for username in usernames])
+
+    def read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as handle:
+            return json.load(handle)['row']
+
+    def write_checkpoint(self, row):
+        if not self.checkpoint:
+            return
+        with open(self.checkpoint + '.tmp', 'w') as handle:
+            json.dump({'row': row}, handle)
+        os.replace(self.checkpoint + '.tmp', self.checkpoint)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipe.ingredients import index_recipe_ingredients
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Re-parse every recipe ingredient list into the ingredient index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of recipes parsed per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = 0
+        last_id = 0
+
+        while True:
+            batch = list(Recipe.objects.filter(id__gt=last_id).order_by('id')
+                         .only('id', 'ingredients')[:batch_size])
+            if not batch:
+                break
+            index_recipe_ingredients(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS('Indexed ingredients of %d recipes.' % indexed))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipe.models import Recipe
+from recipe.search import FIELD_WEIGHTS, index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of recipes indexed per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['id'] + [field for field, _ in FIELD_WEIGHTS]
+        indexed = 0
+        last_id = 0
+
+        while True:
+            batch = list(Recipe.objects.filter(id__gt=last_id).order_by('id')
+                         .only(*fields)[:batch_size])
+            if not batch:
+                break
+            index_recipes(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS('Indexed %d recipes.' % indexed))
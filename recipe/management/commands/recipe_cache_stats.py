@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipe.cache import get_cache_alias, is_shared, stats
+
+
+class Command(BaseCommand):
+    help = ('Report hit/miss counters of the recipe response cache. The counters '
+            'live in the cache, so they need a shared backend such as memcached.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Reset the counters after reporting them.')
+
+    def handle(self, *args, **options):
+        if not is_shared(get_cache_alias()):
+            self.stderr.write('The recipe cache is local to each process, so responses '
+                              'are not cached. Set MEMCACHED_LOCATION to enable it.')
+        counters = stats(reset=options['reset'])
+        total = counters['hit'] + counters['miss']
+        ratio = counters['hit'] / total if total else 0.0
+        self.stdout.write('hits=%d misses=%d hit_ratio=%.3f' % (
+            counters['hit'], counters['miss'], ratio))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like/bookmark counters and repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of recipes checked per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted recipes without updating them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checked = repaired = 0
+        last_id = 0
+
+        while True:
+            ids = list(Recipe.objects.filter(id__gt=last_id).order_by('id')
+                       .values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+
+            live = Recipe.objects.live_count_expressions()
+            drifted = Recipe.objects.filter(id__in=ids).annotate(
+                live_likes=live['like_count'],
+                live_bookmarks=live['bookmark_count'],
+            ).filter(~Q(like_count=F('live_likes')) | ~Q(bookmark_count=F('live_bookmarks')))
+            drifted_ids = list(drifted.values_list('id', flat=True))
+
+            if dry_run or not drifted_ids:
+                repaired += len(drifted_ids)
+                continue
+            with transaction.atomic():
+                # The UPDATE recomputes the counts itself, so increments
+                # committed since the check are never overwritten.
+                repaired += Recipe.objects.filter(id__in=drifted_ids).update(**live)
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            'Checked %d recipes, %d %s.' % (checked, repaired, verb)))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipe.images import resume_pending
+
+
+class Command(BaseCommand):
+    help = ('Process staged image uploads left pending by a stopped process. '
+            'Run it at startup or from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=600,
+                            help='Skip uploads staged less than this many seconds ago.')
+
+    def handle(self, *args, **options):
+        resumed = resume_pending(options['older_than'])
+        self.stdout.write(self.style.SUCCESS('Resumed %d image jobs.' % resumed))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.9 on 2026-10-18 10:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def backfill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeLike = apps.get_model('recipe', 'RecipeLike')
+    Bookmark = apps.get_model('users', 'Profile').bookmarks.through
+
+    def live_count(model):
+        counts = model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe').annotate(total=Count('*')).values('total')[:1]
+        return Coalesce(Subquery(counts), 0)
+
+    last_id = 0
+    while True:
+        ids = list(Recipe.objects.filter(id__gt=last_id).order_by('id').values_list(
+            'id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        Recipe.objects.filter(id__in=ids).update(
+            like_count=live_count(RecipeLike), bookmark_count=live_count(Bookmark))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_recipe_keyset_indexes'),
+        ('users', '0002_profile_bookmarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
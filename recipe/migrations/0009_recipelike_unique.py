@@ -0,0 +1,38 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeLike = apps.get_model('recipe', 'RecipeLike')
+
+    duplicates = (RecipeLike.objects.order_by().values('user', 'recipe')
+                  .annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1))
+    recipe_ids = set()
+    for duplicate in duplicates.iterator():
+        RecipeLike.objects.filter(user=duplicate['user'], recipe=duplicate['recipe']).exclude(
+            id=duplicate['keep']).delete()
+        recipe_ids.add(duplicate['recipe'])
+
+    # The duplicates were counted into like_count; count again.
+    counts = RecipeLike.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe').annotate(total=Count('*')).values('total')[:1]
+    Recipe.objects.filter(id__in=recipe_ids).update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipe_picture_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recipelike',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipe_like_unique'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_recipelike_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=10)),
+                ('score', models.FloatField(default=0)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='recipe.recipe')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=10, unique=True)),
+                ('epoch', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipetrendingscore',
+            index=models.Index(fields=['window', '-score'], name='recipe_trending_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetrendingscore',
+            constraint=models.UniqueConstraint(fields=('window', 'recipe'), name='recipe_trending_score_unique'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:39
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicate_bookmarks(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeBookmark = apps.get_model('recipe', 'RecipeBookmark')
+
+    duplicates = (RecipeBookmark.objects.order_by().values('user', 'recipe')
+                  .annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1))
+    recipe_ids = set()
+    for duplicate in duplicates.iterator():
+        RecipeBookmark.objects.filter(user=duplicate['user'], recipe=duplicate['recipe']).exclude(
+            id=duplicate['keep']).delete()
+        recipe_ids.add(duplicate['recipe'])
+
+    counts = RecipeBookmark.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe').annotate(total=Count('*')).values('total')[:1]
+    Recipe.objects.filter(id__in=recipe_ids).update(bookmark_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_feedcandidate_feedstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_bookmarks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipebookmark',
+            index=models.Index(fields=['user', '-created'], name='recipe_bookmark_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipebookmark',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='recipe_bookmark_unique'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0013_recipebookmark_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientIndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
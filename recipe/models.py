@@ -1,7 +1,53 @@
-from django.db import models
+import copy
+
+from django.db import connections, models, router
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .images import READY, STATUS_CHOICES
+
+
+def snapshot(values):
+    # JSON values are copied, so changes made in place are noticed.
+    return {name: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+            for name, value in values}
+
+
+class LoadedValuesMixin:
+    """
+    Keeps the field values an instance was loaded with, so a save can tell
+    which fields it changes.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = snapshot(zip(field_names, values))
+        return instance
+
+    def has_changed(self, field_name, update_fields=None):
+        """
+        Whether a save with `update_fields` writes a new value of the field.
+        Fields of instances not loaded from the database count as changed.
+        """
+        if update_fields is not None and field_name not in update_fields:
+            return False
+        attname = self._meta.get_field(field_name).attname
+        loaded = getattr(self, '_loaded_values', {})
+        if attname not in loaded:
+            return True
+        # Deferred fields that were never read cannot have changed.
+        return attname in self.__dict__ and self.__dict__[attname] != loaded[attname]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = snapshot(
+            (field.attname, self.__dict__[field.attname])
+            for field in self._meta.concrete_fields if field.attname in self.__dict__)
+
 
 class RecipeCategory(models.Model):
     """
@@ -24,7 +70,52 @@ def get_default_recipe_category():
     return RecipeCategory.objects.get_or_create(name='Others')[0]
 
 
-class Recipe(models.Model):
+def count_subquery(queryset, group_by):
+    """
+    Correlated COUNT(*) usable as an annotation without multiplying rows.
+    """
+    counts = queryset.order_by().values(group_by).annotate(total=Count('*'))
+    return Coalesce(Subquery(counts.values('total')[:1]), 0)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """
+        Join author and category, so serializing N recipes stays one query.
+        Like and bookmark counts are read from the denormalized columns.
+        """
+        return self.select_related('author', 'category')
+
+    def adjust_counts(self, likes=0, bookmarks=0):
+        """
+        Atomically shift the denormalized counters with F() expressions.
+        Call it inside the transaction that writes the like/bookmark rows.
+        """
+        changes = {}
+        for field, delta in (('like_count', likes), ('bookmark_count', bookmarks)):
+            if delta > 0:
+                changes[field] = F(field) + delta
+            elif delta < 0:
+                # Clamp so a drifted counter never underflows the unsigned column.
+                changes[field] = Greatest(F(field) + delta, 0)
+        if not changes:
+            return 0
+        return self.update(**changes)
+
+    def live_count_expressions(self):
+        """
+        Correlated COUNT subqueries for the values the counters should hold.
+        """
+        bookmarks = RecipeBookmark.objects.filter(recipe=OuterRef('pk'))
+        likes = RecipeLike.objects.filter(recipe=OuterRef('pk'))
+        return {
+            'like_count': count_subquery(likes, 'recipe'),
+            'bookmark_count': count_subquery(bookmarks, 'recipe'),
+        }
+
+
+class Recipe(LoadedValuesMixin, models.Model):
     """
     Recipe model
     """
@@ -33,6 +124,9 @@ class Recipe(models.Model):
     category = models.ForeignKey(
         RecipeCategory, related_name="recipe_list", on_delete=models.SET(get_default_recipe_category))
     picture = models.ImageField(upload_to='uploads')
+    picture_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=READY, editable=False)
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=200)
     desc = models.CharField(_('Short description'), max_length=200)
     cook_time = models.TimeField()
@@ -40,19 +134,90 @@ class Recipe(models.Model):
     procedure = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('like_count', 'bookmark_count')
 
     class Meta:
-        ordering = ('-created_at', )
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='recipe_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'],
+                         name='recipe_author_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The counters are only ever moved by F() updates; writing back the
+        # in-memory values would clobber concurrent increments. Other fields
+        # are written when changed, so handlers can trust `update_fields`.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+                and (field.name == 'updated_at' or self.has_changed(field.name))]
+        super().save(*args, **kwargs)
+
     def get_total_number_of_likes(self):
         return self.recipelike_set.count()
     def get_total_number_of_bookmarks(self):
         return self.bookmarked_by.count()
 
 
+class RecipeLikeQuerySet(models.QuerySet):
+    """
+    Like writes in raw statements. Both bypass model signals, so callers
+    adjust the counters and invalidate cached responses themselves.
+    """
+
+    def like(self, user_id, recipe_id):
+        """
+        Insert the like unless it exists, or the recipe does not; returns
+        whether a row was inserted.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        ops = connection.ops
+        opts = self.model._meta
+        created = opts.get_field('created').get_db_prep_save(timezone.now(), connection)
+        # INSERT ... SELECT inserts nothing for a missing recipe instead of
+        # relying on the foreign key, which MySQL's INSERT IGNORE would skip.
+        sql = '%s %s (%s, %s, %s) SELECT %%s, %s, %%s FROM %s WHERE %s = %%s %s' % (
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(opts.db_table),
+            ops.quote_name(opts.get_field('user').column),
+            ops.quote_name(opts.get_field('recipe').column),
+            ops.quote_name(opts.get_field('created').column),
+            ops.quote_name(Recipe._meta.pk.column),
+            ops.quote_name(Recipe._meta.db_table),
+            ops.quote_name(Recipe._meta.pk.column),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, created, recipe_id])
+            return cursor.rowcount == 1
+
+    def unlike(self, user_id, recipe_id):
+        """
+        Delete the like; returns when it had been created, or None when
+        there was no like to delete.
+
+        Reading `created` takes a SELECT before the DELETE, since MySQL has
+        no DELETE ... RETURNING. The trending score decays, so retracting
+        the like at its own time rather than at now is worth the trip.
+        """
+        rows = self.filter(user_id=user_id, recipe_id=recipe_id)
+        created = rows.values_list('created', flat=True).first()
+        if created is None or not rows._raw_delete(rows.db):
+            return None
+        return created
+
+
 class RecipeLike(models.Model):
     """
     Model to like recipes
@@ -62,6 +227,181 @@ class RecipeLike(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = RecipeLikeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'], name='recipe_like_unique'),
+        ]
+
+    def __str__(self):
+        return self.user.username
+
+
+class RecipeBookmark(models.Model):
+    """
+    Model to bookmark recipes; the through table of `CustomUser.bookmarks`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'], name='recipe_bookmark_unique'),
+        ]
+        indexes = [
+            # Recently saved first; InnoDB appends the id to break ties.
+            models.Index(fields=['user', '-created'], name='recipe_bookmark_recent_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
-    
+
+
+class RecipeSearchTerm(models.Model):
+    """
+    Inverted index posting: weighted occurrence of a term in a recipe.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='search_terms', on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'recipe'],
+                                    name='recipe_search_term_unique'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class Ingredient(models.Model):
+    """
+    Normalized ingredient vocabulary parsed from recipe ingredient lists.
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """
+    Ingredient parsed from a recipe's ingredient list.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='ingredient_entries', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(
+        Ingredient, related_name='recipe_entries', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'ingredient'],
+                                    name='recipe_ingredient_unique'),
+        ]
+
+    def __str__(self):
+        return self.ingredient.name
+
+
+class IngredientIndexVersion(models.Model):
+    """
+    Single row counting changes to `RecipeIngredient`, so every process can
+    tell when its in-memory pantry index is stale.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.version)
+
+
+class RecipeTrendingScore(models.Model):
+    """
+    Exponentially decayed popularity of a recipe in one trending window,
+    stored relative to the window's `TrendingEpoch`.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='trending_scores', on_delete=models.CASCADE)
+    window = models.CharField(max_length=10)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'recipe'],
+                                    name='recipe_trending_score_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['window', '-score'], name='recipe_trending_rank_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.window, self.recipe_id)
+
+
+class TrendingEpoch(models.Model):
+    """
+    Reference time the scores of a trending window are scaled to.
+    """
+    window = models.CharField(max_length=10, unique=True)
+    epoch = models.FloatField()
+
+    def __str__(self):
+        return self.window
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Precomputed nearest neighbour of a recipe, `rank` 0 being the closest.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='similar_entries', on_delete=models.CASCADE)
+    similar = models.ForeignKey(Recipe, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'rank'],
+                                    name='recipe_similarity_rank_unique'),
+        ]
+
+    def __str__(self):
+        return '%s ~ %s' % (self.recipe_id, self.similar_id)
+
+
+class FeedCandidate(models.Model):
+    """
+    Materialized home feed entry of a user, `rank` 0 shown first.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='feed_candidates', on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'rank'], name='feed_candidate_rank_unique'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.user_id, self.recipe_id)
+
+
+class FeedState(models.Model):
+    """
+    When a user's interactions last changed and when their feed was built;
+    the feed is stale while `changed_at` is the later one.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True,
+                                related_name='feed_state', on_delete=models.CASCADE)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return str(self.user_id)
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the ordering columns instead of using
+    OFFSET, so every page costs the same index range scan.
+
+    The ordering must be unique, hence the trailing `id` tie-breaker, and
+    should be backed by a composite index in the same column order.
+
+    Endpoints that pick one of several paginators per request name each
+    `cursor_source`; the cursor records it, and a cursor of another source
+    restarts from the first page.
+    """
+    ordering = ('-id', )
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, cursor_source=None):
+        self.cursor_source = cursor_source
+
+    def is_requested(self, request):
+        """
+        Paginated mode is opt-in so existing clients keep the flat list.
+        """
+        return (self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        position = [self.get_value(self.page[-1], field)
+                    for field in self.get_field_names()]
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(position))
+
+    def get_field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_value(self, obj, field_name):
+        value = getattr(obj, self.model._meta.get_field(field_name).attname)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def get_seek_filter(self, position):
+        """
+        Build the lexicographic "strictly after" condition, e.g. for
+        ('-created_at', '-id'):
+            created_at < c OR (created_at = c AND id < i)
+        """
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{'%s__%s' % (name, lookup): value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def encode_cursor(self, position):
+        if self.cursor_source is not None:
+            position = [self.cursor_source] + position
+        payload = json.dumps(position, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = base64.urlsafe_b64decode(encoded.encode('ascii'))
+            raw = json.loads(payload.decode('ascii'))
+            fields = self.get_field_names()
+            if not isinstance(raw, list):
+                raise ValueError
+            if self.cursor_source is not None:
+                if not raw or raw[0] != self.cursor_source:
+                    return None
+                raw = raw[1:]
+            if len(raw) != len(fields):
+                raise ValueError
+            return [self.model._meta.get_field(name).to_python(value)
+                    for name, value in zip(fields, raw)]
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecipeCursorPagination(KeysetPagination):
+    """
+    Newest recipes first, matching `Recipe.Meta.ordering`.
+    """
+    ordering = ('-created_at', '-id')
+
+
+class FeedCandidatePagination(KeysetPagination):
+    """
+    Feed entries in rank order; `(user, rank)` is unique.
+    """
+    ordering = ('rank', )
+
+
+class TrendingScorePagination(KeysetPagination):
+    """
+    Trending scores, best first.
+    """
+    ordering = ('-score', '-id')
+
+
+class BookmarkPagination(KeysetPagination):
+    """
+    A user's bookmarks, recently saved first, over `(user, -created)`.
+    """
+    ordering = ('-created', '-id')
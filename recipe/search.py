@@ -0,0 +1,125 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Recipe, RecipeSearchTerm
+
+# Bengali letters, vowel signs, hasanta, nukta and the zero-width joiners used
+# inside conjuncts all belong to one word. `\w` alone would split a word at
+# every vowel sign, because combining marks are not alphanumeric.
+TOKEN_RE = re.compile('[\u0980-\u09FF\u200C\u200D]+|[^\\W_]+')
+ZERO_WIDTH = dict.fromkeys((0x200C, 0x200D))
+BENGALI_DIGITS = str.maketrans('\u09E6\u09E7\u09E8\u09E9\u09EA\u09EB\u09EC\u09ED\u09EE\u09EF', '0123456789')
+HASANTA = '\u09CD'
+TA = '\u09A4'
+KHANDA_TA = '\u09CE'
+MAX_TERM_LENGTH = 64
+
+# Relative importance of a term hit in each indexed field.
+FIELD_WEIGHTS = (
+    ('title', 8.0),
+    ('desc', 4.0),
+    ('ingredients', 2.0),
+    ('procedure', 1.0),
+)
+DOC_COUNT_CACHE_KEY = 'recipe:search:doc-count'
+
+
+def normalize_token(token):
+    """
+    Fold the spellings of a word that render identically to one form.
+    """
+    # NFC composes split vowel signs (e.g. ে + া -> ো) and decomposes the
+    # nukta letters (ড় -> ড + ়) consistently.
+    token = unicodedata.normalize('NFC', token).translate(ZERO_WIDTH)
+    # ত + hasanta at the end of a word is the legacy spelling of khanda ta.
+    if token.endswith(TA + HASANTA):
+        token = token[:-2] + KHANDA_TA
+    return token.translate(BENGALI_DIGITS).casefold()
+
+
+def tokenize(text):
+    """
+    Split text into normalized search terms.
+    """
+    tokens = []
+    for match in TOKEN_RE.finditer(text or ''):
+        token = normalize_token(match.group())
+        # Drop fragments made only of marks, e.g. a stray hasanta.
+        if any(unicodedata.category(char)[0] in 'LN' for char in token):
+            tokens.append(token[:MAX_TERM_LENGTH])
+    return tokens
+
+
+def term_weights(recipe):
+    """
+    Weighted, log-damped term frequencies of a recipe across all fields.
+    """
+    weights = Counter()
+    for field, field_weight in FIELD_WEIGHTS:
+        for term, frequency in Counter(tokenize(getattr(recipe, field))).items():
+            weights[term] += field_weight * (1 + math.log(frequency))
+    return weights
+
+
+def index_recipe(recipe):
+    """
+    Replace the postings of one recipe.
+    """
+    terms = [RecipeSearchTerm(recipe_id=recipe.id, term=term, weight=weight)
+             for term, weight in term_weights(recipe).items()]
+    with transaction.atomic():
+        RecipeSearchTerm.objects.filter(recipe_id=recipe.id).delete()
+        RecipeSearchTerm.objects.bulk_create(terms)
+    cache.delete(DOC_COUNT_CACHE_KEY)
+
+
+def index_recipes(recipes, batch_size=1000):
+    """
+    Rebuild the postings of many recipes with one delete and batched inserts.
+    """
+    recipes = list(recipes)
+    terms = [RecipeSearchTerm(recipe_id=recipe.id, term=term, weight=weight)
+             for recipe in recipes
+             for term, weight in term_weights(recipe).items()]
+    with transaction.atomic():
+        RecipeSearchTerm.objects.filter(
+            recipe_id__in=[recipe.id for recipe in recipes]).delete()
+        RecipeSearchTerm.objects.bulk_create(terms, batch_size=batch_size)
+    cache.delete(DOC_COUNT_CACHE_KEY)
+
+
+def document_count():
+    return cache.get_or_set(DOC_COUNT_CACHE_KEY, Recipe.objects.count, 300)
+
+
+def search(query, limit=20, offset=0):
+    """
+    Return `(recipe_id, score)` pairs ranked by weighted BM25-style IDF.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    frequencies = dict(RecipeSearchTerm.objects.filter(term__in=terms)
+                       .values_list('term').annotate(Count('id')).order_by())
+    if not frequencies:
+        return []
+
+    total = max(document_count(), max(frequencies.values()))
+    idf = Case(
+        *[When(term=term, then=Value(math.log(1 + (total - df + 0.5) / (df + 0.5))))
+          for term, df in frequencies.items()],
+        output_field=FloatField(),
+    )
+    ranked = (RecipeSearchTerm.objects.filter(term__in=frequencies)
+              .values('recipe')
+              .annotate(score=Sum(idf * F('weight'), output_field=FloatField()))
+              .order_by('-score', '-recipe'))
+    return [(row['recipe'], row['score'])
+            for row in ranked[offset:offset + limit]]
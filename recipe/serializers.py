@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from . import likebuffer
+from .images import accept_image, variant_urls
 from .models import Recipe, RecipeCategory, RecipeLike
 
 
@@ -10,19 +12,84 @@ class RecipeCategorySerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
+    """
+    Pass `fields` to render a sparse fieldset; `restrict_queryset` then
+    loads only the columns those fields read.
+    """
     author = serializers.PrimaryKeyRelatedField(read_only=True)
     username = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
     category = RecipeCategorySerializer()
     total_number_of_likes = serializers.SerializerMethodField()
     total_number_of_bookmarks = serializers.SerializerMethodField()
+    picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'category', 'category_name', 'picture', 'title', 'desc',
+        fields = ('id', 'category', 'category_name', 'picture', 'picture_status',
+                  'picture_variants', 'title', 'desc',
                   'cook_time', 'ingredients', 'procedure', 'author', 'username',
                   'total_number_of_likes', 'total_number_of_bookmarks')
 
+    # Model columns read by each field.
+    field_columns = {
+        'id': ('id', ),
+        'category': ('category__id', 'category__name'),
+        'category_name': ('category__name', ),
+        'picture': ('picture', ),
+        'picture_status': ('picture_status', ),
+        'picture_variants': ('picture_variants', ),
+        'title': ('title', ),
+        'desc': ('desc', ),
+        'cook_time': ('cook_time', ),
+        'ingredients': ('ingredients', ),
+        'procedure': ('procedure', ),
+        'author': ('author', ),
+        'username': ('author__username', ),
+        'total_number_of_likes': ('like_count', ),
+        'total_number_of_bookmarks': ('bookmark_count', ),
+    }
+    # Always loaded: the key and the pagination ordering.
+    required_columns = ('id', 'created_at')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """
+        Fields selected by `?fields=` and `?exclude=`, or None for all.
+        """
+        included = request.query_params.get('fields')
+        excluded = request.query_params.get('exclude')
+        if not included and not excluded:
+            return None
+        names = set(cls.Meta.fields)
+        if included:
+            names &= {name.strip() for name in included.split(',')}
+        if excluded:
+            names -= {name.strip() for name in excluded.split(',')}
+        return names
+
+    @classmethod
+    def restrict_queryset(cls, queryset, fields=None):
+        """
+        Defer every column the requested fields do not read.
+        """
+        if fields is None:
+            return queryset.for_listing()
+        columns = set(cls.required_columns)
+        for name in fields:
+            columns.update(cls.field_columns[name])
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        if related:
+            # select_related() without arguments would follow every FK.
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns, *related)
+
     def get_username(self, obj):
         return obj.author.username
 
@@ -30,17 +97,25 @@ class RecipeSerializer(serializers.ModelSerializer):
         return obj.category.name
 
     def get_total_number_of_likes(self, obj):
-        return obj.get_total_number_of_likes()
+        if likebuffer.is_enabled():
+            return max(obj.like_count + likebuffer.get_like_buffer().delta(obj.id), 0)
+        return obj.like_count
 
     def get_total_number_of_bookmarks(self, obj):
-        return obj.get_total_number_of_bookmarks()
+        return obj.bookmark_count
+
+    def get_picture_variants(self, obj):
+        return variant_urls(obj, 'picture')
 
     def create(self, validated_data):
         category = validated_data.pop('category')
+        picture = validated_data.pop('picture', None)
         category_instance, created = RecipeCategory.objects.get_or_create(
             **category)
         recipe_instance = Recipe.objects.create(
             **validated_data, category=category_instance)
+        if picture:
+            accept_image(recipe_instance, 'picture', picture)
         return recipe_instance
 
     def update(self, instance, validated_data):
@@ -51,7 +126,11 @@ class RecipeSerializer(serializers.ModelSerializer):
 
             nested_serializer.update(nested_instance, nested_data)
 
-        return super(RecipeSerializer, self).update(instance, validated_data)
+        picture = validated_data.pop('picture', None)
+        instance = super(RecipeSerializer, self).update(instance, validated_data)
+        if picture:
+            accept_image(instance, 'picture', picture)
+        return instance
 
 
 class RecipeLikeSerializer(serializers.ModelSerializer):
@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache as response_cache
+from . import feed, trending
+from .images import image_processed
+from .ingredients import index_recipe_ingredients, invalidate_pantry_index
+from .models import Recipe, RecipeCategory, RecipeLike
+from .search import DOC_COUNT_CACHE_KEY, FIELD_WEIGHTS, index_recipe
+
+INDEXED_FIELDS = {field for field, _ in FIELD_WEIGHTS}
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or INDEXED_FIELDS.intersection(update_fields):
+        index_recipe(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def update_ingredient_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'ingredients' in update_fields:
+        index_recipe_ingredients([instance])
+
+
+@receiver(post_save, sender=Recipe)
+def score_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        trending.record(instance.id, 'recipe')
+
+
+@receiver(post_save, sender=RecipeLike)
+def record_like(sender, instance, created, **kwargs):
+    # Only ORM saves get here; the like view and buffer record their own writes.
+    if created:
+        trending.record(instance.recipe_id, 'like')
+        feed.mark_dirty([instance.user_id])
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, **kwargs):
+    # Postings and ingredient rows go with the recipe through the cascade.
+    cache.delete(DOC_COUNT_CACHE_KEY)
+    invalidate_pantry_index()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    response_cache.bump(response_cache.recipe_scope(instance.id),
+                        response_cache.author_scope(instance.author.username),
+                        response_cache.LIST)
+
+
+@receiver(post_save, sender=RecipeLike)
+@receiver(post_delete, sender=RecipeLike)
+def invalidate_liked_recipe_responses(sender, instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=RecipeCategory)
+@receiver(post_delete, sender=RecipeCategory)
+def invalidate_category_responses(sender, instance, **kwargs):
+    response_cache.bump(response_cache.CATALOG)
+
+
+@receiver(image_processed, sender=Recipe)
+def invalidate_processed_picture(sender, pk, **kwargs):
+    # The job writes with update(), which sends no post_save.
+    invalidate_recipes([pk])
+
+
+def invalidate_recipes(recipe_ids, authors=None):
+    """
+    Bump the scopes of recipes whose counts or membership changed. Pass the
+    usernames of their `authors` when known to save looking them up.
+    """
+    if authors is None:
+        authors = Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'author__username', flat=True).distinct()
+    response_cache.bump(response_cache.LIST,
+                        *[response_cache.recipe_scope(recipe_id) for recipe_id in recipe_ids],
+                        *[response_cache.author_scope(username) for username in authors])
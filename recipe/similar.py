@@ -0,0 +1,171 @@
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Recipe, RecipeIngredient, RecipeSimilarity
+from .search import tokenize
+
+# Weight of a feature occurrence in each field. Title and description words
+# share one feature space, so a word in either matches both.
+FEATURE_WEIGHTS = {
+    'title': 2.0,
+    'desc': 1.0,
+    'ingredient': 2.0,
+    'category': 1.0,
+}
+
+
+def build_vectors():
+    """
+    Return `(recipe_ids, matrix)`: one L2-normalized TF-IDF row per recipe
+    over words, parsed ingredients and the category.
+    """
+    features = {}
+    rows, columns, values = [], [], []
+    recipe_ids = []
+    position = {}
+
+    def add(row, feature, weight):
+        rows.append(row)
+        columns.append(features.setdefault(feature, len(features)))
+        values.append(weight)
+
+    recipes = Recipe.objects.order_by('id').values_list('id', 'title', 'desc', 'category_id')
+    for recipe_id, title, desc, category_id in recipes.iterator():
+        row = position[recipe_id] = len(recipe_ids)
+        recipe_ids.append(recipe_id)
+        for field, text in (('title', title), ('desc', desc)):
+            for term in tokenize(text):
+                add(row, ('word', term), FEATURE_WEIGHTS[field])
+        add(row, ('category', category_id), FEATURE_WEIGHTS['category'])
+    entries = RecipeIngredient.objects.order_by().values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in entries.iterator():
+        if recipe_id in position:
+            add(position[recipe_id], ('ingredient', ingredient_id), FEATURE_WEIGHTS['ingredient'])
+
+    if not recipe_ids:
+        return np.array([], dtype=np.int64), sparse.csr_matrix((0, 0))
+    # Repeated (row, column) pairs are summed.
+    matrix = sparse.csr_matrix((np.array(values, dtype=np.float64), (rows, columns)),
+                               shape=(len(recipe_ids), len(features)))
+    matrix.sum_duplicates()
+    matrix.data = 1 + np.log(matrix.data)
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + matrix.shape[0]) / (1 + document_frequency)) + 1
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = sparse.diags(1 / norms) @ matrix
+    return np.array(recipe_ids, dtype=np.int64), sparse.csr_matrix(matrix)
+
+
+def nearest(matrix, rows, block_size=500):
+    """
+    Yield `(row, columns, scores)` with the cosine similarity of each given
+    row to every other row it shares a feature with. Rows are multiplied a
+    block at a time, so memory stays proportional to the block.
+    """
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = (matrix[block] @ transposed).tocsr()
+        for offset, row in enumerate(block):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+            keep = columns != row
+            yield row, columns[keep], values[keep]
+
+
+def top(columns, scores, limit):
+    """
+    The `limit` best `(column, score)` pairs, best first.
+    """
+    if len(scores) > limit:
+        best = np.argpartition(-scores, limit)[:limit]
+        columns, scores = columns[best], scores[best]
+    order = np.lexsort((columns, -scores))
+    return list(zip(columns[order].tolist(), scores[order].tolist()))
+
+
+def stale_recipe_ids():
+    """
+    Recipes edited after their neighbours were computed, or never computed.
+    """
+    computed = dict(RecipeSimilarity.objects.order_by().values_list('recipe')
+                    .annotate(Max('computed_at')))
+    return [recipe_id for recipe_id, updated_at
+            in Recipe.objects.values_list('id', 'updated_at').iterator()
+            if recipe_id not in computed or updated_at > computed[recipe_id]]
+
+
+def update_similar_recipes(full=False, limit=10, block_size=500):
+    """
+    Recompute the neighbours of new and edited recipes, or of all recipes
+    with `full`. Returns the number of recipes whose list was rewritten.
+
+    An incremental run also merges the changed recipes into the lists of
+    every other recipe they are similar to; IDF weights of unchanged
+    recipes are refreshed only by a full run.
+    """
+    recipe_ids, matrix = build_vectors()
+    recipe_ids = recipe_ids.tolist()
+    if not recipe_ids:
+        return 0
+    position = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+    if full:
+        dirty = list(range(len(recipe_ids)))
+    else:
+        dirty = sorted(position[recipe_id] for recipe_id in stale_recipe_ids()
+                       if recipe_id in position)
+
+    lists = {}
+    # Similarities from the dirty rows to every other row, for the merge.
+    incoming = defaultdict(dict)
+    for row, columns, scores in nearest(matrix, dirty, block_size):
+        lists[recipe_ids[row]] = [(recipe_ids[column], score)
+                                  for column, score in top(columns, scores, limit)]
+        if not full:
+            for column, score in zip(columns.tolist(), scores.tolist()):
+                incoming[recipe_ids[column]][recipe_ids[row]] = score
+
+    if dirty and not full:
+        changed = set(lists)
+        referencing = RecipeSimilarity.objects.filter(similar__in=changed).values_list(
+            'recipe', flat=True)
+        affected = (set(incoming) | set(referencing)) - changed
+        current = defaultdict(dict)
+        rows = RecipeSimilarity.objects.filter(recipe__in=affected).values_list(
+            'recipe', 'similar', 'score')
+        for recipe_id, similar_id, score in rows.iterator():
+            current[recipe_id][similar_id] = score
+        for recipe_id in affected:
+            neighbours = {similar_id: score for similar_id, score in current[recipe_id].items()
+                          if similar_id not in changed}
+            neighbours.update(incoming.get(recipe_id, {}))
+            merged = sorted(neighbours.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            if merged != sorted(current[recipe_id].items(), key=lambda item: (-item[1], item[0])):
+                lists[recipe_id] = merged
+
+    write_similar_recipes(lists)
+    return len(lists)
+
+
+def write_similar_recipes(lists, batch_size=1000):
+    """
+    Replace the stored neighbours of the recipes in `lists`.
+    """
+    computed_at = timezone.now()
+    recipe_ids = sorted(lists)
+    for start in range(0, len(recipe_ids), batch_size):
+        chunk = recipe_ids[start:start + batch_size]
+        with transaction.atomic():
+            RecipeSimilarity.objects.filter(recipe__in=chunk).delete()
+            RecipeSimilarity.objects.bulk_create([
+                RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id, score=score,
+                                 rank=rank, computed_at=computed_at)
+                for recipe_id in chunk
+                for rank, (similar_id, score) in enumerate(lists[recipe_id])])
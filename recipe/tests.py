@@ -1,3 +1,1086 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import json
+import os
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (FeedCandidate, Recipe, RecipeBookmark, RecipeCategory, RecipeLike,
+                     RecipeSearchTerm, RecipeTrendingScore)
+from . import images, likebuffer, trending
+from .ingredients import parse_ingredients
+from .search import tokenize
+from .serializers import RecipeSerializer
+
+User = get_user_model()
+
+
+def create_recipe(author, category, **kwargs):
+    data = {
+        'title': 'Shorshe Ilish',
+        'desc': 'Hilsa in mustard gravy',
+        'cook_time': datetime.time(0, 40),
+        'ingredients': 'ilish, shorshe',
+        'procedure': 'Cook it.',
+        'picture': 'uploads/ilish.jpg',
+    }
+    data.update(kwargs)
+    return Recipe.objects.create(author=author, category=category, **data)
+
+
+class RecipeTestMixin:
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='rana@example.com', password='pass1234', username='rana')
+        self.other = User.objects.create_user(
+            email='mitu@example.com', password='pass1234', username='mitu')
+        self.category = RecipeCategory.objects.create(name='Fish')
+
+
+class SharedCacheMixin:
+    """
+    Run against a file cache, which worker processes share like memcached.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        super().setUp()
+
+
+class RecipeListPaginationTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        created_at = timezone.now()
+        for i in range(7):
+            author = self.user if i % 2 else self.other
+            recipe = create_recipe(author, self.category, title='Recipe %d' % i)
+            # Share timestamps between pairs so the `id` tie-breaker is exercised.
+            Recipe.objects.filter(id=recipe.id).update(
+                created_at=created_at - datetime.timedelta(minutes=i // 2))
+
+    def walk(self, params):
+        url = reverse('recipe:recipe-list')
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages += 1
+            ids.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_unpaginated_list_is_unchanged(self):
+        response = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 7)
+
+    def test_pages_follow_model_ordering_without_gaps(self):
+        ids, pages = self.walk({'page_size': 2})
+        expected = list(Recipe.objects.values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_author_filter_is_applied_inside_pagination(self):
+        ids, _ = self.walk({'page_size': 2, 'author__username': 'rana'})
+        expected = list(Recipe.objects.filter(
+            author=self.user).values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(
+            reverse('recipe:recipe-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeQueryCountTests(RecipeTestMixin, APITestCase):
+
+    def add_recipes(self, count):
+        for i in range(count):
+            recipe = create_recipe(self.user, self.category, title='Recipe %d' % i)
+            RecipeLike.objects.create(user=self.other, recipe=recipe)
+            self.other.bookmarks.add(recipe)
+        call_command('reconcile_recipe_counters', stdout=StringIO())
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+
+    def test_recipe_list_query_count_is_constant(self):
+        url = reverse('recipe:recipe-list')
+        self.add_recipes(1)
+        single, _ = self.count_queries(url)
+        self.add_recipes(4)
+        many, response = self.count_queries(url)
+        self.assertEqual(single, many)
+        self.assertEqual(single, 1)
+        self.assertEqual(response.data[0]['total_number_of_likes'], 1)
+        self.assertEqual(response.data[0]['total_number_of_bookmarks'], 1)
+        self.assertEqual(response.data[0]['username'], 'rana')
+        self.assertEqual(response.data[0]['category_name'], 'Fish')
+
+    def test_recipe_detail_is_one_query(self):
+        self.add_recipes(1)
+        recipe = Recipe.objects.get()
+        self.client.force_authenticate(self.other)
+        queries, response = self.count_queries(
+            reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.assertEqual(queries, 1)
+        self.assertEqual(response.data['total_number_of_likes'], 1)
+
+    def test_user_bookmarks_query_count_is_constant(self):
+        self.client.force_authenticate(self.other)
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        self.add_recipes(1)
+        single, _ = self.count_queries(url)
+        self.add_recipes(4)
+        many, response = self.count_queries(url)
+        self.assertEqual(single, many)
+        self.assertEqual(len(response.data), 5)
+
+    def test_user_bookmarks_pagination(self):
+        self.client.force_authenticate(self.other)
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        self.add_recipes(3)
+        _, response = self.count_queries(url, page_size=2)
+        self.assertEqual(len(response.data['results']), 2)
+        _, response = self.count_queries(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+
+class RecipeCounterTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+        self.client.force_authenticate(self.other)
+
+    def assertCounts(self, likes, bookmarks):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.like_count, likes)
+        self.assertEqual(self.recipe.bookmark_count, bookmarks)
+
+    def test_like_toggle_updates_like_count(self):
+        url = reverse('recipe:recipe-like', args=[self.recipe.id])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertCounts(1, 0)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertCounts(0, 0)
+
+    def test_put_and_delete_are_idempotent(self):
+        url = reverse('recipe:recipe-like', args=[self.recipe.id])
+        response = self.client.put(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'liked': True, 'like_count': 1})
+        response = self.client.put(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'liked': True, 'like_count': 1})
+        self.assertEqual(RecipeLike.objects.count(), 1)
+
+        for _ in range(2):
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {'liked': False, 'like_count': 0})
+        self.assertCounts(0, 0)
+
+    def test_like_query_count(self):
+        url = reverse('recipe:recipe-like', args=[self.recipe.id])
+        self.client.put(url)
+        self.client.delete(url)
+        # Insert, counter update, counter read, trending and feed updates,
+        # plus the savepoint pair of the test transaction.
+        with self.assertNumQueries(7):
+            self.assertEqual(self.client.put(url).data['like_count'], 1)
+
+    def test_like_of_missing_recipe_returns_404(self):
+        url = reverse('recipe:recipe-like', args=[self.recipe.id + 1])
+        self.assertEqual(self.client.put(url).status_code, 404)
+        self.assertFalse(RecipeLike.objects.exists())
+
+    def test_duplicate_likes_are_rejected(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.recipe)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RecipeLike.objects.create(user=self.other, recipe=self.recipe)
+
+    def test_bookmark_add_and_remove_update_bookmark_count(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        self.client.post(url, {'id': self.recipe.id})
+        self.client.post(url, {'id': self.recipe.id})
+        self.assertCounts(0, 1)
+        self.client.delete(url, {'id': self.recipe.id})
+        self.assertCounts(0, 0)
+
+    def test_bookmarks_in_bulk(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        second = create_recipe(self.user, self.category, title='Beguni')
+        response = self.client.post(url, {'ids': [self.recipe.id, second.id]}, format='json')
+        self.assertEqual(response.data, {'bookmark_count': 2})
+        response = self.client.post(url, {'ids': [self.recipe.id]}, format='json')
+        self.assertEqual(response.data, {'bookmark_count': 2})
+        self.assertCounts(0, 1)
+        response = self.client.delete(url, {'ids': [self.recipe.id, second.id]}, format='json')
+        self.assertEqual(response.data, {'bookmark_count': 0})
+        self.assertCounts(0, 0)
+
+    def test_bulk_bookmark_query_count_is_constant(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+
+        def post(count):
+            ids = [create_recipe(self.user, self.category).id for _ in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(context)
+
+        post(1)  # creates the user's feed state
+        self.assertEqual(post(2), post(20))
+
+    def test_bookmarks_list_recently_saved_first(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        older = create_recipe(self.user, self.category, title='Beguni')
+        self.client.post(url, {'ids': [self.recipe.id]}, format='json')
+        saved = RecipeBookmark.objects.get().created
+        RecipeBookmark.objects.update(created=saved - datetime.timedelta(hours=1))
+        self.client.post(url, {'ids': [older.id]}, format='json')
+        response = self.client.get(url)
+        self.assertEqual([recipe['id'] for recipe in response.data], [older.id, self.recipe.id])
+        response = self.client.get(url, {'since': (saved - datetime.timedelta(minutes=1)).isoformat()})
+        self.assertEqual([recipe['id'] for recipe in response.data], [older.id])
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.data['results'][0]['id'], older.id)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['id'], self.recipe.id)
+
+    def test_bookmark_of_missing_recipe_returns_404(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        response = self.client.post(url, {'ids': [self.recipe.id, self.recipe.id + 1]},
+                                    format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertCounts(0, 0)
+
+    def test_recipe_save_does_not_overwrite_counters(self):
+        stale = Recipe.objects.get(id=self.recipe.id)
+        Recipe.objects.filter(id=self.recipe.id).adjust_counts(likes=3)
+        stale.title = 'Bhapa Ilish'
+        stale.save()
+        self.assertCounts(3, 0)
+
+    def test_recipe_save_writes_changed_fields_only(self):
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        recipe.cook_time = datetime.time(0, 50)
+        with CaptureQueriesContext(connection) as context:
+            recipe.save()
+        sql = ' '.join(query['sql'] for query in context)
+        self.assertNotIn('"title"', sql)
+        self.assertNotIn('recipe_recipesearchterm', sql)
+        self.assertNotIn('recipe_recipeingredient', sql)
+        recipe.title = 'Bhapa Ilish'
+        with CaptureQueriesContext(connection) as context:
+            recipe.save()
+        self.assertIn('recipe_recipesearchterm', ' '.join(query['sql'] for query in context))
+
+    def test_reconcile_repairs_drift(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.recipe)
+        Recipe.objects.filter(id=self.recipe.id).update(bookmark_count=5)
+        out = StringIO()
+        call_command('reconcile_recipe_counters', batch_size=1, stdout=out)
+        self.assertIn('1 repaired', out.getvalue())
+        self.assertCounts(1, 0)
+
+
+
+@override_settings(RECIPE_LIKE_BUFFER={'ENABLED': True, 'INTERVAL': 0, 'MAX_PENDING': 100})
+class RecipeLikeBufferTests(SharedCacheMixin, RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        likebuffer._buffer = None
+        self.addCleanup(setattr, likebuffer, '_buffer', None)
+        self.recipe = create_recipe(self.user, self.category)
+        self.url = reverse('recipe:recipe-like', args=[self.recipe.id])
+        self.client.force_authenticate(self.other)
+
+    def test_reads_include_queued_likes(self):
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'liked': True, 'like_count': 1})
+        self.assertFalse(RecipeLike.objects.exists())
+        self.assertEqual(self.client.get(self.url).data, {'liked': True, 'like_count': 1})
+        detail = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertEqual(detail.data['total_number_of_likes'], 1)
+
+        self.assertEqual(likebuffer.get_like_buffer().flush(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.like_count, 1)
+        self.assertEqual(self.client.get(self.url).data, {'liked': True, 'like_count': 1})
+
+    def test_queued_like_invalidates_cached_responses(self):
+        detail_url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+        self.client.get(detail_url)
+        self.assertEqual(self.client.get(detail_url)['X-Cache'], 'HIT')
+        self.client.put(self.url)
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_number_of_likes'], 1)
+
+    def test_events_are_coalesced_per_user_and_recipe(self):
+        RecipeLike.objects.like(self.user.id, self.recipe.id)
+        Recipe.objects.filter(id=self.recipe.id).adjust_counts(likes=1)
+        self.client.put(self.url)
+        self.client.post(self.url)
+        self.client.put(self.url)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.delete(self.url).data['like_count'], 1)
+
+        likebuffer.get_like_buffer().flush()
+        self.assertEqual(list(RecipeLike.objects.values_list('user', flat=True)), [self.other.id])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.like_count, 1)
+
+    @override_settings(RECIPE_LIKE_BUFFER={'ENABLED': True, 'INTERVAL': 0, 'MAX_PENDING': 2})
+    def test_flushes_when_full(self):
+        self.client.put(self.url)
+        self.assertFalse(RecipeLike.objects.exists())
+        self.client.force_authenticate(self.user)
+        self.client.put(self.url)
+        self.assertEqual(RecipeLike.objects.count(), 2)
+        self.assertEqual(likebuffer.get_like_buffer().delta(self.recipe.id), 0)
+
+
+class RecipeTrendingTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old = create_recipe(self.user, self.category, title='Old')
+        self.new = create_recipe(self.user, self.category, title='New')
+        self.url = reverse('recipe:recipe-trending')
+
+    def trending_titles(self, **params):
+        return [recipe['title'] for recipe in self.client.get(self.url, params).data]
+
+    def test_likes_and_bookmarks_raise_scores(self):
+        self.assertEqual(self.trending_titles(), ['New', 'Old'])
+        self.client.force_authenticate(self.other)
+        self.client.put(reverse('recipe:recipe-like', args=[self.old.id]))
+        self.assertEqual(self.trending_titles(), ['Old', 'New'])
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('users:user-bookmark', args=[self.user.id]), {'id': self.new.id})
+        self.assertEqual(self.trending_titles(window='week', limit=1), ['New'])
+
+        self.client.delete(reverse('users:user-bookmark', args=[self.user.id]), {'id': self.new.id})
+        self.assertEqual(self.trending_titles(), ['Old', 'New'])
+
+    def test_unlike_retracts_score_at_like_time(self):
+        url = reverse('recipe:recipe-like', args=[self.old.id])
+        for user in (self.user, self.other):
+            self.client.force_authenticate(user)
+            self.client.put(url)
+        before = dict(trending.top('day'))[self.old.id]
+        with mock.patch('recipe.trending.time.time', return_value=time.time() + 24 * 3600):
+            self.client.delete(url)
+        # The recipe itself weighs 3 and each like 1.
+        self.assertAlmostEqual(dict(trending.top('day'))[self.old.id] / before, 4 / 5, places=3)
+
+    def test_compaction_rescales_without_reordering(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.old)
+        before = trending.top('day')
+        trending.compact(now=time.time() + 3600)
+        after = trending.top('day')
+        self.assertEqual([recipe_id for recipe_id, _ in after], [recipe_id for recipe_id, _ in before])
+        self.assertAlmostEqual(after[0][1], before[0][1], places=3)
+
+        trending.compact(now=time.time() + 365 * 24 * 3600)
+        self.assertFalse(RecipeTrendingScore.objects.filter(window='day').exists())
+
+    def test_rebuild_matches_incremental_scores(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.old)
+        before = dict(trending.top('month'))
+        out = StringIO()
+        call_command('compact_trending', rebuild=True, stdout=out)
+        self.assertIn('Rebuilt 6', out.getvalue())
+        for recipe_id, score in trending.top('month'):
+            self.assertAlmostEqual(score, before[recipe_id], places=3)
+
+    def test_unknown_window_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'window': 'year'}).status_code, 400)
+
+
+class RecipeSimilarTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        dessert = RecipeCategory.objects.create(name='Dessert')
+        self.ilish = create_recipe(self.user, self.category, title='Shorshe Ilish')
+        self.bhapa = create_recipe(self.user, self.category, title='Bhapa Ilish',
+                                   desc='Steamed hilsa in mustard')
+        self.payesh = create_recipe(self.user, dessert, title='Payesh', desc='Rice pudding',
+                                    ingredients='rice, milk, sugar')
+
+    def similar_ids(self, recipe):
+        return [entry['id'] for entry in self.client.get(
+            reverse('recipe:recipe-similar', args=[recipe.id])).data]
+
+    def test_neighbours_are_ranked_and_served_in_one_query(self):
+        call_command('build_similar_recipes', stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.similar_ids(self.ilish)[0], self.bhapa.id)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(self.payesh.id, self.similar_ids(self.ilish))
+
+    def test_incremental_run_updates_edited_recipes_and_their_neighbours(self):
+        call_command('build_similar_recipes', stdout=StringIO())
+        self.payesh.title = 'Ilish Payesh'
+        self.payesh.category = self.category
+        self.payesh.ingredients = 'ilish, shorshe'
+        self.payesh.save()
+
+        call_command('build_similar_recipes', stdout=StringIO())
+        self.assertIn(self.ilish.id, self.similar_ids(self.payesh))
+        self.assertIn(self.payesh.id, self.similar_ids(self.ilish))
+
+    def test_missing_recipe_returns_404(self):
+        response = self.client.get(reverse('recipe:recipe-similar', args=[self.payesh.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeFeedTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(
+            email='tania@example.com', password='pass1234', username='tania')
+        self.ilish, self.bhapa, self.payesh = [
+            create_recipe(self.user, self.category, title=title)
+            for title in ('Shorshe Ilish', 'Bhapa Ilish', 'Payesh')]
+        self.url = reverse('recipe:recipe-feed')
+
+    def feed_ids(self, user, **params):
+        self.client.force_authenticate(user)
+        return [recipe['id'] for recipe in self.client.get(self.url, params).data['results']]
+
+    def test_feed_recommends_co_liked_recipes(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.ilish)
+        RecipeLike.objects.create(user=self.other, recipe=self.bhapa)
+        self.client.force_authenticate(self.reader)
+        self.client.put(reverse('recipe:recipe-like', args=[self.ilish.id]))
+
+        call_command('build_recipe_feed', stdout=StringIO())
+        self.assertEqual(self.feed_ids(self.reader), [self.bhapa.id])
+        self.assertFalse(FeedCandidate.objects.filter(user=self.other).exists())
+
+        # Only users with new interactions are rebuilt.
+        out = StringIO()
+        call_command('build_recipe_feed', stdout=out)
+        self.assertIn('Built 0 feeds', out.getvalue())
+        self.client.post(reverse('users:user-bookmark', args=[self.reader.id]),
+                         {'id': self.bhapa.id})
+        call_command('build_recipe_feed', stdout=out)
+        self.assertIn('Built 1 feeds', out.getvalue())
+
+    def test_feed_is_cursor_paginated(self):
+        for recipe in (self.ilish, self.bhapa, self.payesh):
+            RecipeLike.objects.create(user=self.other, recipe=recipe)
+        RecipeLike.objects.create(user=self.reader, recipe=self.ilish)
+        call_command('build_recipe_feed', stdout=StringIO())
+
+        self.client.force_authenticate(self.reader)
+        first = self.client.get(self.url, {'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(first['results'] + second['results']), 2)
+        self.assertIsNone(second['next'])
+
+    def test_cold_start_falls_back_to_trending(self):
+        RecipeLike.objects.create(user=self.other, recipe=self.payesh)
+        self.assertEqual(self.feed_ids(self.reader)[0], self.payesh.id)
+        RecipeTrendingScore.objects.all().delete()
+        self.assertEqual(self.feed_ids(self.reader)[0], self.payesh.id)
+
+    def test_cursor_of_another_source_restarts(self):
+        self.client.force_authenticate(self.reader)
+        first = self.client.get(self.url, {'page_size': 1}).data
+        self.assertEqual(first['results'][0]['id'], self.payesh.id)
+        FeedCandidate.objects.create(user=self.reader, recipe=self.ilish, score=1, rank=0)
+        response = self.client.get(first['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['id'] for recipe in response.data['results']], [self.ilish.id])
+        response = self.client.get(self.url, {'cursor': 'bm90IGpzb24'})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeSearchTests(RecipeTestMixin, APITestCase):
+
+    def test_tokenize_keeps_bengali_words_whole(self):
+        # Split only at spaces, never at vowel signs or the nukta.
+        text = '\u099A\u09BF\u0982\u09A1\u09BC\u09BF \u09AE\u09BE\u099B\u09C7\u09B0 \u09AE\u09BE\u09B2\u09BE\u0987\u0995\u09BE\u09B0\u09BF'
+        self.assertEqual(tokenize(text), text.split())
+
+    def test_tokenize_normalizes_equivalent_spellings(self):
+        # Split vowel sign (e + aa) equals the precomposed o.
+        self.assertEqual(tokenize('\u0995\u09C7\u09BE\u09B2'), tokenize('\u0995\u09CB\u09B2'))
+        # Precomposed rra equals dda + nukta.
+        self.assertEqual(tokenize('\u09AC\u09DC\u09BE'), tokenize('\u09AC\u09A1\u09BC\u09BE'))
+        # Legacy ta + hasanta (+ ZWJ) equals khanda ta.
+        self.assertEqual(tokenize('\u09B9\u09A0\u09BE\u09A4\u09CD\u200D'), tokenize('\u09B9\u09A0\u09BE\u09CE'))
+        # Bengali digits and Latin case are folded.
+        self.assertEqual(tokenize('\u09E7\u09E6 Dal'), ['10', 'dal'])
+
+    def test_search_ranks_title_matches_first(self):
+        in_procedure = create_recipe(
+            self.user, self.category, title='Bhuna Khichuri', procedure='Serve with ilish.')
+        in_title = create_recipe(
+            self.user, self.category, title='Ilish Paturi', ingredients='ilish, kola pata')
+        create_recipe(self.user, self.category, title='Dal', ingredients='mushur', procedure='Boil.')
+
+        response = self.client.get(reverse('recipe:recipe-search'), {'q': 'ILISH'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data],
+                         [in_title.id, in_procedure.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        recipe = create_recipe(self.user, self.category, title='Beguni')
+        recipe.title = 'Piyaju'
+        recipe.save()
+        terms = set(RecipeSearchTerm.objects.filter(recipe=recipe).values_list('term', flat=True))
+        self.assertIn('piyaju', terms)
+        self.assertNotIn('beguni', terms)
+        recipe.delete()
+        self.assertFalse(RecipeSearchTerm.objects.exists())
+
+    def test_missing_query_is_rejected(self):
+        response = self.client.get(reverse('recipe:recipe-search'))
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipePantryTests(RecipeTestMixin, APITestCase):
+
+    def test_parse_ingredients_strips_quantities_and_units(self):
+        text = '2 cups rice\n1 tbsp ginger paste, salt to taste; 500 g Ilish fish'
+        self.assertEqual(parse_ingredients(text), ['rice', 'ginger', 'salt', 'ilish fish'])
+
+    def test_recipes_ranked_by_coverage_then_missing(self):
+        full = create_recipe(self.user, self.category, title='Khichuri',
+                             ingredients='rice, dal, salt')
+        half = create_recipe(self.user, self.category, title='Ilish Pulao',
+                             ingredients='rice, ilish fish, onion, ghee')
+        create_recipe(self.user, self.category, title='Beguni',
+                      ingredients='begun, besan')
+
+        response = self.client.post(reverse('recipe:recipe-pantry'),
+                                    {'items': ['Rice', 'dal', 'salt', 'ilish']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['recipe']['id'] for item in response.data], [full.id, half.id])
+        self.assertEqual(response.data[0]['coverage'], 1.0)
+        self.assertEqual(response.data[1]['missing'], ['ghee', 'onion'])
+
+    def test_rejects_body_without_items_list(self):
+        url = reverse('recipe:recipe-pantry')
+        for body in (['rice'], {'items': 5}):
+            response = self.client.post(url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('message', response.data)
+
+    def test_index_follows_ingredient_edits(self):
+        recipe = create_recipe(self.user, self.category, ingredients='rice')
+        url = reverse('recipe:recipe-pantry')
+        self.assertEqual(len(self.client.get(url, {'items': 'chicken'}).data), 0)
+        recipe.ingredients = 'chicken, rice'
+        recipe.save()
+        self.assertEqual(len(self.client.get(url, {'items': 'chicken'}).data), 1)
+
+    def test_index_follows_edits_of_other_processes(self):
+        recipe = create_recipe(self.user, self.category, ingredients='rice')
+        url = reverse('recipe:recipe-pantry')
+        self.assertEqual(len(self.client.get(url, {'items': 'chicken'}).data), 0)
+        # Another process has a cache of its own.
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'other-process'}}):
+            recipe.ingredients = 'chicken, rice'
+            recipe.save()
+        self.assertEqual(len(self.client.get(url, {'items': 'chicken'}).data), 1)
+
+
+class RecipeResponseCacheTests(SharedCacheMixin, RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+        self.client.force_authenticate(self.other)
+        self.detail_url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+    def test_second_read_is_served_from_cache(self):
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(context), 0)
+        self.assertEqual(response.data['title'], 'Shorshe Ilish')
+
+    def test_like_invalidates_detail_and_lists(self):
+        list_url = reverse('recipe:recipe-list')
+        self.client.get(self.detail_url)
+        self.client.get(list_url)
+        self.client.get(list_url, {'author__username': 'rana'})
+
+        self.client.post(reverse('recipe:recipe-like', args=[self.recipe.id]))
+
+        self.assertEqual(self.client.get(self.detail_url).data['total_number_of_likes'], 1)
+        self.assertEqual(self.client.get(list_url).data[0]['total_number_of_likes'], 1)
+        response = self.client.get(list_url, {'author__username': 'rana'})
+        self.assertEqual(response.data[0]['total_number_of_likes'], 1)
+
+    def test_bookmark_invalidates_detail(self):
+        self.client.get(self.detail_url)
+        self.client.post(reverse('users:user-bookmark', args=[self.other.id]),
+                         {'id': self.recipe.id})
+        self.assertEqual(self.client.get(self.detail_url).data['total_number_of_bookmarks'], 1)
+
+    def test_category_rename_invalidates_recipes(self):
+        self.client.get(self.detail_url)
+        self.category.name = 'Mach'
+        self.category.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['category_name'], 'Mach')
+
+    def test_stats_command_reports_counters(self):
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url)
+        out = StringIO()
+        err = StringIO()
+        call_command('recipe_cache_stats', stdout=out, stderr=err)
+        self.assertIn('hits=1 misses=1', out.getvalue())
+        self.assertFalse(err.getvalue())
+
+    def test_local_cache_caches_nothing(self):
+        err = StringIO()
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get(self.detail_url)
+            self.assertNotIn('X-Cache', self.client.get(self.detail_url))
+            call_command('recipe_cache_stats', stdout=StringIO(), stderr=err)
+        self.assertIn('not cached', err.getvalue())
+
+    def test_only_username_change_invalidates_catalog(self):
+        self.client.get(self.detail_url)
+        author = User.objects.get(id=self.user.id)
+        author.last_login = timezone.now()
+        author.save()
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'HIT')
+        author.username = 'rana2'
+        author.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['username'], 'rana2')
+
+
+class RecipeConditionalGetTests(SharedCacheMixin, RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+        self.client.force_authenticate(self.other)
+        self.detail_url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+    def test_matching_etag_returns_304(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def test_if_modified_since_returns_304(self):
+        with mock.patch('recipe.cache.time') as clock:
+            clock.time.return_value = time.time() + 2
+            response = self.client.get(reverse('recipe:recipe-list'))
+            response = self.client.get(reverse('recipe:recipe-list'),
+                                       HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_within_the_same_second_is_not_hidden(self):
+        like_url = reverse('recipe:recipe-like', args=[self.recipe.id])
+        now = int(time.time()) + 10
+        with mock.patch('recipe.cache.time') as clock:
+            clock.time.return_value = now + 0.2
+            self.client.put(like_url)
+            self.assertNotIn('Last-Modified', self.client.get(self.detail_url))
+            clock.time.return_value = now + 0.7
+            self.client.delete(like_url)
+            response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=http_date(now))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['total_number_of_likes'], 0)
+            clock.time.return_value = now + 1.2
+            last_modified = self.client.get(self.detail_url)['Last-Modified']
+            self.assertEqual(last_modified, http_date(now + 1))
+            response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_like_changes_etag(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.post(reverse('recipe:recipe-like', args=[self.recipe.id]))
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bookmark_changes_bookmark_list_etag(self):
+        url = reverse('users:user-bookmark', args=[self.other.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(url, {'id': self.recipe.id})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_local_cache_sends_no_validators(self):
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class RecipeBatchTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [create_recipe(self.user, self.category, title='Recipe %d' % i)
+                        for i in range(3)]
+        self.client.force_authenticate(self.other)
+        self.url = reverse('recipe:recipe-batch')
+
+    def test_get_keeps_order_and_reports_missing(self):
+        ids = [self.recipes[2].id, 999999, self.recipes[0].id]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.recipes[2].id, self.recipes[0].id])
+        self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(len(context), 1)
+
+    def test_post_body_matches_detail_shape(self):
+        recipe = self.recipes[1]
+        response = self.client.post(self.url, {'ids': [recipe.id]}, format='json')
+        detail = self.client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.assertEqual(response.data['results'][0], detail.data)
+
+    def test_rejects_invalid_and_oversized_requests(self):
+        self.assertEqual(self.client.get(self.url, {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        with self.settings(RECIPE_BATCH_MAX_IDS=2):
+            response = self.client.get(self.url, {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_body_without_ids_list(self):
+        for body in ([self.recipes[0].id], {'ids': {'id': 1}}):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('message', response.data)
+
+
+class RecipeSparseFieldsetTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+        self.client.force_authenticate(self.other)
+
+    def get_with_sql(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_fields_trim_response_and_columns(self):
+        response, sql = self.get_with_sql(
+            reverse('recipe:recipe-list'), {'fields': 'id,title,picture,username'})
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'picture', 'username'})
+        self.assertEqual(response.data[0]['username'], 'rana')
+        self.assertNotIn('"procedure"', sql)
+        self.assertNotIn('"ingredients"', sql)
+        self.assertNotIn('"like_count"', sql)
+        self.assertNotIn('recipe_recipecategory', sql)
+
+    def test_exclude_on_detail(self):
+        response, sql = self.get_with_sql(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+            {'exclude': 'ingredients,procedure'})
+        self.assertNotIn('ingredients', response.data)
+        self.assertEqual(response.data['category'], {'id': self.category.id, 'name': 'Fish'})
+        self.assertEqual(response.data['total_number_of_likes'], 0)
+        self.assertNotIn('"procedure"', sql)
+
+    def test_fields_on_bookmarks(self):
+        self.other.bookmarks.add(self.recipe)
+        response, sql = self.get_with_sql(
+            reverse('users:user-bookmark', args=[self.other.id]), {'fields': 'id,title'})
+        self.assertEqual(response.data, [{'id': self.recipe.id, 'title': 'Shorshe Ilish'}])
+        self.assertNotIn('"ingredients"', sql)
+        self.assertNotIn('recipe_recipecategory', sql)
+
+
+class RecipeExportTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [create_recipe(self.user, self.category, title='Recipe %d' % i)
+                        for i in range(5)]
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('recipe:recipe-export')
+
+    def read_lines(self, content):
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+
+    def test_streams_ndjson_in_id_order(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self.read_lines(b''.join(response.streaming_content))
+        self.assertEqual([line['id'] for line in lines], [r.id for r in self.recipes])
+        self.assertIn('updated_at', lines[0])
+        self.assertEqual(lines[0]['title'], 'Recipe 0')
+
+    def test_resume_from_id_and_gzip(self):
+        response = self.client.get(self.url, {'since_id': self.recipes[2].id, 'gzip': '1'})
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual([line['id'] for line in self.read_lines(content)],
+                         [self.recipes[3].id, self.recipes[4].id])
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.ndjson')
+            call_command('export_recipes', output=path, chunk_size=2, stderr=StringIO())
+            with open(path, 'rb') as handle:
+                self.assertEqual(len(self.read_lines(handle.read())), 5)
+
+
+class RecipeImportTests(RecipeTestMixin, APITestCase):
+
+    rows = [
+        {'title': 'Khichuri', 'desc': 'Rainy day', 'cook_time': '00:45', 'ingredients': 'rice, dal',
+         'procedure': 'Boil.', 'picture': 'uploads/k.jpg', 'category': 'Rice', 'author': 'rana'},
+        {'title': 'Beguni', 'desc': 'Fritters', 'cook_time': '00:20', 'ingredients': 'begun',
+         'procedure': 'Fry.', 'picture': 'uploads/b.jpg', 'category': 'Snacks',
+         'author': 'mitu@example.com'},
+        {'title': 'Orphan', 'desc': 'No author', 'cook_time': '00:20', 'ingredients': 'x',
+         'procedure': 'y', 'picture': 'uploads/o.jpg', 'category': 'Fish', 'author': 'ghost'},
+        {'title': 'Pitha', 'desc': 'Winter cake', 'cook_time': 'soon', 'ingredients': 'rice flour',
+         'procedure': 'Steam.', 'picture': 'uploads/p.jpg', 'category': 'Sweets', 'author': 'rana'},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.directory.name, 'recipes.jsonl')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.writelines(json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def test_imports_valid_rows_and_indexes_them(self):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', self.write_jsonl(self.rows), batch_size=2,
+                     stdout=out, stderr=err)
+        self.assertIn('2 recipes imported, 2 rows skipped', out.getvalue())
+        self.assertIn('Row 3 skipped: Unknown author "ghost"', err.getvalue())
+        self.assertEqual(set(Recipe.objects.values_list('title', flat=True)), {'Khichuri', 'Beguni'})
+        self.assertTrue(RecipeCategory.objects.filter(name='Snacks').exists())
+        self.assertIn('Row 4 skipped: "cook_time"', err.getvalue())
+        self.assertTrue(RecipeSearchTerm.objects.filter(term='khichuri').exists())
+
+    def test_resumes_after_checkpoint(self):
+        path = os.path.join(self.directory.name, 'recipes.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(self.rows[0]))
+            writer.writeheader()
+            writer.writerows(self.rows[:2])
+        checkpoint = os.path.join(self.directory.name, 'checkpoint.json')
+        with open(checkpoint, 'w') as handle:
+            json.dump({'row': 1}, handle)
+
+        call_command('import_recipes', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)), ['Beguni'])
+        with open(checkpoint) as handle:
+            self.assertEqual(json.load(handle), {'row': 2})
+
+    def test_dry_run_writes_nothing(self):
+        call_command('import_recipes', self.write_jsonl(self.rows), dry_run=True,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(RecipeCategory.objects.filter(name='Snacks').exists())
+
+
+def image_upload(name='photo.jpg', size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class RecipeImagePipelineTests(RecipeTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(
+            DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage',
+            MEDIA_ROOT=self.media.name,
+            IMAGE_STAGING_ROOT=os.path.join(self.media.name, 'staging'),
+            IMAGE_PIPELINE={'EAGER': True, 'SIZES': {'thumb': 100, 'large': 400}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.recipe = create_recipe(self.user, self.category)
+
+    def save_picture(self, upload):
+        serializer = RecipeSerializer(self.recipe, data={'picture': upload}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        self.assertEqual(serializer.data['picture_status'], images.PENDING)
+        self.recipe.refresh_from_db()
+
+    def test_upload_is_resized_into_variants(self):
+        self.save_picture(image_upload())
+        self.assertEqual(self.recipe.picture_status, images.READY)
+        self.assertEqual(set(self.recipe.picture_variants), {'thumb', 'large'})
+        self.assertEqual(self.recipe.picture.name, self.recipe.picture_variants['large']['jpg'])
+        with Image.open(self.recipe.picture.path) as picture:
+            self.assertEqual(picture.size, (400, 200))
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'staging')), [])
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertTrue(response.data['picture_variants']['thumb']['webp'].endswith('.webp'))
+
+    def test_unreadable_upload_is_marked_failed(self):
+        # Uploads are validated by the serializer; fail inside the job instead.
+        with self.assertLogs('recipe.images', 'ERROR') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            images.accept_image(self.recipe, 'picture',
+                                SimpleUploadedFile('photo.jpg', b'not an image'))
+        self.assertIn('Processing picture of recipe.Recipe', logs.output[0])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.picture_status, images.FAILED)
+        self.assertEqual(self.recipe.picture.name, 'uploads/ilish.jpg')
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'staging')), [])
+
+    def test_lost_jobs_are_resumed(self):
+        # The commit callbacks never run, as if the process had stopped.
+        images.accept_image(self.recipe, 'picture', SimpleUploadedFile('old.jpg', b'old'))
+        images.accept_image(self.recipe, 'picture', image_upload())
+        out = StringIO()
+        call_command('resume_image_jobs', older_than=0, stdout=out)
+        self.assertIn('Resumed 1 image jobs.', out.getvalue())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.picture_status, images.READY)
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'staging')), [])
+
+    def test_avatar_upload_is_processed(self):
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('users:user-avatar'), {'avatar': image_upload()},
+                                       format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['avatar_status'], images.PENDING)
+        self.user.profile.refresh_from_db()
+        response = self.client.get(reverse('users:user-avatar'))
+        self.assertEqual(response.data['avatar_status'], images.READY)
+        self.assertIn('thumb', response.data['avatar_variants'])
+
+
+class AsyncRecipeViewsTests(RecipeTestMixin, APITransactionTestCase):
+    # Reads run on pool threads, which only see committed rows.
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+
+    def test_list_matches_sync_view(self):
+        response = self.client.get(reverse('recipe:async-recipe-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.client.get(reverse('recipe:recipe-list')).json())
+        response = self.client.get(reverse('recipe:async-recipe-list'),
+                                   {'author__username': 'ghost'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_includes_viewer_state(self):
+        url = reverse('recipe:async-recipe-detail', args=[self.recipe.id])
+        self.assertNotIn('liked', self.client.get(url).json())
+        RecipeLike.objects.create(user=self.other, recipe=self.recipe)
+        token = RefreshToken.for_user(self.other).access_token
+        data = self.client.get(url, HTTP_AUTHORIZATION='Bearer %s' % token).json()
+        self.assertEqual((data['id'], data['liked'], data['bookmarked']),
+                         (self.recipe.id, True, False))
+        url = reverse('recipe:async-recipe-detail', args=[self.recipe.id + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AsyncRecipeConditionalGetTests(SharedCacheMixin, RecipeTestMixin,
+                                     APITransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(self.user, self.category)
+
+    def test_matching_etag_returns_304(self):
+        for url in (reverse('recipe:async-recipe-list'),
+                    reverse('recipe:async-recipe-detail', args=[self.recipe.id])):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_like_changes_detail_etag(self):
+        url = reverse('recipe:async-recipe-detail', args=[self.recipe.id])
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.other)
+        self.client.put(reverse('recipe:recipe-like', args=[self.recipe.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_etag_depends_on_viewer(self):
+        url = reverse('recipe:async-recipe-detail', args=[self.recipe.id])
+        RecipeLike.objects.create(user=self.user, recipe=self.recipe)
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer %s' % token)
+        self.assertIn('Authorization', response['Vary'])
+        token = RefreshToken.for_user(self.other).access_token
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer %s' % token,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['liked'])
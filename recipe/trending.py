@@ -0,0 +1,159 @@
+import functools
+import math
+import operator
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Exp, Greatest
+
+from .models import Recipe, RecipeBookmark, RecipeLike, RecipeTrendingScore, TrendingEpoch
+
+# Decay time constant of each window in seconds: an event counts 1/e as
+# much once that long has passed.
+WINDOWS = {
+    'day': 24 * 3600,
+    'week': 7 * 24 * 3600,
+    'month': 30 * 24 * 3600,
+}
+DEFAULT_WINDOW = 'day'
+
+# Score of one event of each kind; new recipes get a head start.
+WEIGHTS = {
+    'like': 1.0,
+    'bookmark': 2.0,
+    'recipe': 3.0,
+}
+
+# Decayed scores below this are dropped by `compact`.
+PRUNE_BELOW = 0.01
+
+
+def get_epochs():
+    """
+    Epoch of every window, created on first use.
+    """
+    epochs = dict(TrendingEpoch.objects.values_list('window', 'epoch'))
+    missing = [TrendingEpoch(window=window, epoch=time.time())
+               for window in WINDOWS if window not in epochs]
+    if missing:
+        TrendingEpoch.objects.bulk_create(missing, ignore_conflicts=True)
+        epochs = dict(TrendingEpoch.objects.values_list('window', 'epoch'))
+    return epochs
+
+
+def increment(kind, count, at):
+    """
+    SQL expression of the score `count` events of `kind` happening `at` (an
+    expression of a unix time) add to a `RecipeTrendingScore` row.
+
+    Instead of decaying every stored score as time passes, new events are
+    weighted by exp((at - epoch) / tau), which keeps the ordering identical
+    and turns each event into a single addition. The epoch is read in the
+    same statement, so a concurrent `compact` cannot mix two epochs.
+    """
+    epoch = Subquery(TrendingEpoch.objects.filter(window=OuterRef('window')).values('epoch')[:1])
+    return Case(*[
+        When(window=window, then=Value(count * WEIGHTS[kind]) * Exp(
+            (at - epoch) / Value(float(tau))))
+        for window, tau in WINDOWS.items()], default=Value(0.0), output_field=FloatField())
+
+
+def record(recipe_id, kind, count=1, at=None):
+    """
+    Add `count` events of `kind` happening `at` (a unix time, default now)
+    to the scores of a recipe. A negative count retracts events; pass the
+    time they happened so exactly what they added is taken off.
+    """
+    record_many([recipe_id], kind, count, at)
+
+
+def record_many(recipe_ids, kind, count=1, at=None):
+    """
+    `record` for several recipes, all windows moving in one UPDATE. `at`
+    may also map each recipe id to the time of its event.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    if not count or not recipe_ids:
+        return
+    if isinstance(at, dict):
+        at = Case(*[When(recipe_id=recipe_id, then=Value(float(at[recipe_id])))
+                    for recipe_id in recipe_ids], output_field=FloatField())
+    else:
+        at = Value(float(time.time() if at is None else at))
+    scores = RecipeTrendingScore.objects.filter(recipe_id__in=recipe_ids)
+    updated = scores.update(
+        score=Greatest(F('score') + increment(kind, count, at), Value(0.0)))
+    if updated < len(WINDOWS) * len(recipe_ids) and count > 0:
+        get_epochs()
+        existing = set(scores.values_list('recipe_id', 'window'))
+        missing = [(recipe_id, window) for recipe_id in recipe_ids for window in WINDOWS
+                   if (recipe_id, window) not in existing]
+        RecipeTrendingScore.objects.bulk_create([
+            RecipeTrendingScore(recipe_id=recipe_id, window=window, score=0.0)
+            for recipe_id, window in missing], ignore_conflicts=True)
+        RecipeTrendingScore.objects.filter(functools.reduce(operator.or_, [
+            Q(recipe_id=recipe_id, window=window) for recipe_id, window in missing
+        ])).update(score=F('score') + increment(kind, count, at))
+
+
+def top(window, limit=20):
+    """
+    Return `(recipe_id, score)` pairs, best first, with scores decayed to
+    now. Only the first `limit` entries of the rank index are read.
+    """
+    decay = math.exp((get_epochs()[window] - time.time()) / WINDOWS[window])
+    ranked = (RecipeTrendingScore.objects.filter(window=window, score__gt=0)
+              .order_by('-score').values_list('recipe_id', 'score')[:limit])
+    return [(recipe_id, score * decay) for recipe_id, score in ranked]
+
+
+def compact(now=None):
+    """
+    Move every window to a new epoch, rescaling its scores, and delete the
+    scores that decayed away. Run it daily: stored scores grow without
+    bound while the epoch falls behind. Returns the number of rows deleted.
+    """
+    now = time.time() if now is None else now
+    get_epochs()
+    pruned = 0
+    with transaction.atomic():
+        for epoch in TrendingEpoch.objects.select_for_update().filter(window__in=WINDOWS):
+            scores = RecipeTrendingScore.objects.filter(window=epoch.window)
+            scores.update(score=F('score') * math.exp((epoch.epoch - now) / WINDOWS[epoch.window]))
+            pruned += scores.filter(score__lt=PRUNE_BELOW).delete()[0]
+            epoch.epoch = now
+            epoch.save(update_fields=['epoch'])
+    return pruned
+
+
+def rebuild(batch_size=1000):
+    """
+    Recompute every score from stored likes, bookmarks and recipes. Returns
+    the number of scores written.
+    """
+    now = time.time()
+    totals = {window: defaultdict(float) for window in WINDOWS}
+
+    def add(recipe_id, kind, at):
+        for window, tau in WINDOWS.items():
+            totals[window][recipe_id] += WEIGHTS[kind] * math.exp((at.timestamp() - now) / tau)
+
+    for recipe_id, created in Recipe.objects.values_list('id', 'created_at').iterator():
+        add(recipe_id, 'recipe', created)
+    for recipe_id, created in RecipeLike.objects.values_list('recipe_id', 'created').iterator():
+        add(recipe_id, 'like', created)
+    for recipe_id, created in RecipeBookmark.objects.values_list('recipe_id', 'created').iterator():
+        add(recipe_id, 'bookmark', created)
+
+    scores = [RecipeTrendingScore(recipe_id=recipe_id, window=window, score=score)
+              for window, window_totals in totals.items()
+              for recipe_id, score in window_totals.items() if score >= PRUNE_BELOW]
+    with transaction.atomic():
+        RecipeTrendingScore.objects.all().delete()
+        TrendingEpoch.objects.all().delete()
+        TrendingEpoch.objects.bulk_create([TrendingEpoch(window=window, epoch=now)
+                                           for window in WINDOWS])
+        RecipeTrendingScore.objects.bulk_create(scores, batch_size=batch_size)
+    return len(scores)
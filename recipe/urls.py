@@ -1,9 +1,19 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 app_name = 'recipe'
 urlpatterns = [
     path('', views.recipe_list, name='recipe-list'),
     path('create/', views.recipe_create, name='recipe-create'),
+    path('search/', views.recipe_search, name='recipe-search'),
+    path('pantry/', views.recipe_pantry, name='recipe-pantry'),
+    path('feed/', views.recipe_feed, name='recipe-feed'),
+    path('trending/', views.recipe_trending, name='recipe-trending'),
+    path('batch/', views.recipe_batch, name='recipe-batch'),
+    path('export/', views.recipe_export, name='recipe-export'),
     path('<int:pk>/', views.recipe_detail, name='recipe-detail'),
+    path('<int:pk>/similar/', views.recipe_similar, name='recipe-similar'),
     path('<int:pk>/like/', views.recipe_like, name='recipe-like'),
+    # Async reads, for the ASGI app.
+    path('async/', async_views.recipe_list, name='async-recipe-list'),
+    path('async/<int:pk>/', async_views.recipe_detail, name='async-recipe-detail'),
 ]
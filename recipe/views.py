@@ -1,23 +1,51 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from django.conf import settings
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
-from .models import Recipe, RecipeLike
-from .serializers import RecipeLikeSerializer, RecipeSerializer
+from .models import FeedCandidate, Recipe, RecipeLike, RecipeSimilarity, RecipeTrendingScore
+from . import cache as response_cache
+from . import feed, likebuffer, trending
+from .export import gzip_stream, iter_ndjson, iter_recipe_chunks
+from .ingredients import get_pantry_index
+from .pagination import (FeedCandidatePagination, RecipeCursorPagination,
+                         TrendingScorePagination)
+from .search import search
+from .serializers import RecipeSerializer
+from .signals import invalidate_recipes
 from .permissions import IsAuthorOrReadOnly
 
 User = get_user_model()
 
 
+def recipe_list_scopes(request):
+    author_username = request.GET.get('author__username')
+    if author_username:
+        return [response_cache.CATALOG, response_cache.author_scope(author_username)]
+    return [response_cache.CATALOG, response_cache.LIST]
+
+
+def recipe_detail_scopes(request, pk):
+    return [response_cache.CATALOG, response_cache.recipe_scope(pk)]
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@response_cache.conditional_response(recipe_list_scopes)
+@response_cache.cache_response(recipe_list_scopes)
 def recipe_list(request):
     """
     Get a collection of recipes filtered by author's username.
+
+    Passing `cursor` or `page_size` switches to keyset pagination.
     """
     author_username = request.GET.get('author__username')
+    fields = RecipeSerializer.get_requested_fields(request)
 
     if author_username:
         try:
@@ -27,10 +55,81 @@ def recipe_list(request):
             return Response({"message": "User not found."}, status=404)
     else:
         queryset = Recipe.objects.all()
+    queryset = RecipeSerializer.restrict_queryset(queryset, fields)
+
+    paginator = RecipeCursorPagination()
+    if paginator.is_requested(request):
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = RecipeSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+    serializer = RecipeSerializer(queryset, many=True, fields=fields)
+    return Response(serializer.data)
 
-    serializer = RecipeSerializer(queryset, many=True)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recipe_search(request):
+    """
+    Full-text search over title, description, ingredients and procedure,
+    best matches first.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({"message": "Query parameter 'q' is required."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    ranked_ids = [recipe_id for recipe_id, score in search(query, limit=limit)]
+    recipes = Recipe.objects.for_listing().in_bulk(ranked_ids)
+    serializer = RecipeSerializer(
+        [recipes[recipe_id] for recipe_id in ranked_ids if recipe_id in recipes], many=True)
     return Response(serializer.data)
 
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def recipe_pantry(request):
+    """
+    Rank recipes by how much of their ingredient list the given pantry
+    items cover. Items come from `?items=a,b` or a POST body `{"items": [...]}`.
+    """
+    if request.method == 'POST':
+        data = request.data if isinstance(request.data, dict) else {}
+        items = data.get('items') or []
+        if isinstance(items, str):
+            items = items.split(',')
+        elif not isinstance(items, list):
+            items = []
+    else:
+        items = request.GET.get('items', '').split(',')
+    items = [str(item).strip() for item in items if str(item).strip()]
+    if not items:
+        return Response({"message": "At least one pantry item is required."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    ranked = get_pantry_index().rank(items, limit=limit)
+    recipes = Recipe.objects.for_listing().in_bulk([recipe_id for recipe_id, _, _ in ranked])
+    results = []
+    for recipe_id, coverage, missing in ranked:
+        if recipe_id not in recipes:
+            continue
+        results.append({
+            'recipe': RecipeSerializer(recipes[recipe_id]).data,
+            'coverage': round(coverage, 4),
+            'missing_count': len(missing),
+            'missing': missing,
+        })
+    return Response(results)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def recipe_create(request):
@@ -44,18 +143,139 @@ def recipe_create(request):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recipe_trending(request):
+    """
+    Recipes trending in a time window, from likes, bookmarks and recency
+    with exponential decay. `window` is one of day, week or month.
+    """
+    window = request.GET.get('window', trending.DEFAULT_WINDOW)
+    if window not in trending.WINDOWS:
+        return Response({"message": "Window must be one of: %s." % ', '.join(trending.WINDOWS)},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    ranked_ids = [recipe_id for recipe_id, score in trending.top(window, limit=limit)]
+    recipes = Recipe.objects.for_listing().in_bulk(ranked_ids)
+    serializer = RecipeSerializer(
+        [recipes[recipe_id] for recipe_id in ranked_ids if recipe_id in recipes], many=True)
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recipe_feed(request):
+    """
+    Personalized feed from recipes liked and bookmarked together with the
+    user's own, precomputed by build_recipe_feed. Users without a feed get
+    this week's trending recipes, or the newest ones. Paging on after the
+    source changed starts over from the first page of the new one.
+    """
+    candidates = FeedCandidate.objects.filter(user=request.user)
+    if candidates.exists():
+        paginator = FeedCandidatePagination(cursor_source='feed')
+        page = paginator.paginate_queryset(
+            candidates.select_related('recipe__author', 'recipe__category'), request)
+        recipes = [candidate.recipe for candidate in page]
+    else:
+        scores = RecipeTrendingScore.objects.filter(window='week', score__gt=0)
+        if scores.exists():
+            paginator = TrendingScorePagination(cursor_source='trending')
+            page = paginator.paginate_queryset(
+                scores.select_related('recipe__author', 'recipe__category'), request)
+            recipes = [score.recipe for score in page]
+        else:
+            paginator = RecipeCursorPagination(cursor_source='newest')
+            recipes = paginator.paginate_queryset(Recipe.objects.for_listing(), request)
+
+    serializer = RecipeSerializer(recipes, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def recipe_batch(request):
+    """
+    Get many recipes by id in one round trip, in the requested order.
+    Ids come from `?ids=1,2,3` or a POST body `{"ids": [...]}`.
+    """
+    if request.method == 'POST':
+        data = request.data if isinstance(request.data, dict) else {}
+        raw_ids = data.get('ids') or []
+        if isinstance(raw_ids, str):
+            raw_ids = raw_ids.split(',')
+        elif not isinstance(raw_ids, list):
+            raw_ids = [raw_ids]
+    else:
+        raw_ids = request.GET.get('ids', '').split(',')
+
+    try:
+        ids = list(dict.fromkeys(int(raw_id) for raw_id in raw_ids if str(raw_id).strip()))
+    except (TypeError, ValueError):
+        return Response({"message": "Ids must be integers."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    max_ids = getattr(settings, 'RECIPE_BATCH_MAX_IDS', 100)
+    if not ids or len(ids) > max_ids:
+        return Response({"message": "Provide between 1 and %d ids." % max_ids},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    recipes = Recipe.objects.for_listing().in_bulk(ids)
+    serializer = RecipeSerializer(
+        [recipes[recipe_id] for recipe_id in ids if recipe_id in recipes], many=True)
+    return Response({
+        'results': serializer.data,
+        'missing': [recipe_id for recipe_id in ids if recipe_id not in recipes],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def recipe_export(request):
+    """
+    Stream the whole catalog as NDJSON in id order, optionally gzipped.
+    Resume with `since_id` (last exported id) and `updated_since`.
+    """
+    updated_since = None
+    try:
+        since_id = int(request.GET.get('since_id', 0))
+        if request.GET.get('updated_since'):
+            updated_since = parse_datetime(request.GET['updated_since'])
+            if updated_since is None:
+                raise ValueError
+    except ValueError:
+        return Response({"message": "Invalid since_id or updated_since."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    stream = iter_ndjson(iter_recipe_chunks(since_id, updated_since))
+    if request.GET.get('gzip') in ('1', 'true'):
+        response = StreamingHttpResponse(gzip_stream(stream), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="recipes.ndjson.gz"'
+    else:
+        response = StreamingHttpResponse(stream, content_type='application/x-ndjson')
+    return response
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthorOrReadOnly])
+@response_cache.conditional_response(recipe_detail_scopes)
+@response_cache.cache_response(recipe_detail_scopes)
 def recipe_detail(request, pk):
     """
     Get, update, or delete a recipe.
     """
-    recipe = get_object_or_404(Recipe, id=pk)
-
     if request.method == 'GET':
-        serializer = RecipeSerializer(recipe)
+        fields = RecipeSerializer.get_requested_fields(request)
+        queryset = RecipeSerializer.restrict_queryset(Recipe.objects.all(), fields)
+        recipe = get_object_or_404(queryset, id=pk)
+        serializer = RecipeSerializer(recipe, fields=fields)
         return Response(serializer.data)
-    elif request.method == 'PUT':
+
+    recipe = get_object_or_404(Recipe.objects.for_listing(), id=pk)
+    if request.method == 'PUT':
         serializer = RecipeSerializer(recipe, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -65,36 +285,104 @@ def recipe_detail(request, pk):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['POST', 'DELETE'])
+@api_view(['GET', 'POST', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def recipe_like(request, pk):
     """
-    Like or dislike a recipe.
+    Like (PUT) or unlike (DELETE) a recipe. Both are idempotent and return
+    the like count; POST toggles the like and GET reports it.
     """
-    recipe = get_object_or_404(Recipe, id=pk)
+    if likebuffer.is_enabled():
+        return buffered_like(request, pk)
 
-    if request.method == 'POST':
-        new_like, created = RecipeLike.objects.get_or_create(user=request.user, recipe=recipe)
-        if created:
-            new_like.save()
-            return Response(status=status.HTTP_201_CREATED)
+    recipes = Recipe.objects.filter(id=pk)
+    if request.method == 'GET':
+        like_count = recipes.values_list('like_count', flat=True).first()
+        if like_count is None:
+            raise Http404
+        liked = RecipeLike.objects.filter(user=request.user, recipe_id=pk).exists()
+        return Response({'liked': liked, 'like_count': like_count})
+
+    # `unliked` is the creation time of a deleted like.
+    unliked = None
+    with transaction.atomic():
+        if request.method == 'PUT':
+            liked, changed = True, RecipeLike.objects.like(request.user.id, pk)
+        elif request.method == 'DELETE':
+            unliked = RecipeLike.objects.unlike(request.user.id, pk)
+            liked, changed = False, unliked is not None
         else:
-            like = RecipeLike.objects.filter(user=request.user, recipe=recipe)
-            if like.exists():
-                like.delete()
-                return Response(status=status.HTTP_200_OK)
+            liked = changed = RecipeLike.objects.like(request.user.id, pk)
+            if not changed:
+                unliked = RecipeLike.objects.unlike(request.user.id, pk)
+                changed = unliked is not None
+        if changed:
+            recipes.adjust_counts(likes=1 if liked else -1)
+        # The author comes along for invalidation, saving a query.
+        row = recipes.values_list('like_count', 'author__username').first()
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if row is None:
+        raise Http404
+    like_count, author = row
+    if changed:
+        # The raw writes send no signals.
+        invalidate_recipes([pk], authors=[author])
+        if liked:
+            trending.record(pk, 'like')
+        else:
+            trending.record(pk, 'like', -1, at=unliked.timestamp())
+        feed.mark_dirty([request.user.id])
+    created = changed and liked
+    return Response({'liked': liked, 'like_count': like_count},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-    elif request.method == 'DELETE':
-        like = RecipeLike.objects.filter(user=request.user, recipe=recipe)
-        if like.exists():
-            like.delete()
-            return Response(status=status.HTTP_200_OK)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    
 
-    
+def buffered_like(request, pk):
+    """
+    `recipe_like` through the like buffer. Writes reach the database on the
+    next flush; the answer already includes the queued events.
+    """
+    row = Recipe.objects.filter(id=pk).values_list('like_count', 'author__username').first()
+    if row is None:
+        raise Http404
+    like_count, author = row
 
-    
-   
+    buffer = likebuffer.get_like_buffer()
+    changed = False
+    if request.method == 'GET':
+        liked = buffer.is_liked(request.user.id, pk)
+    else:
+        if request.method == 'PUT':
+            liked = True
+        elif request.method == 'DELETE':
+            liked = False
+        else:
+            liked = not buffer.is_liked(request.user.id, pk)
+        changed = buffer.submit(request.user.id, pk, liked)
+        if changed:
+            # Cached responses add the queued delta once rebuilt.
+            invalidate_recipes([pk], authors=[author])
+
+    like_count = max(like_count + buffer.delta(pk), 0)
+    created = changed and liked
+    return Response({'liked': liked, 'like_count': like_count},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recipe_similar(request, pk):
+    """
+    Recipes most similar to this one, precomputed by build_similar_recipes.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 100)
+    except ValueError:
+        limit = 10
+
+    entries = list(RecipeSimilarity.objects.filter(recipe_id=pk).order_by('rank')
+                   .select_related('similar__author', 'similar__category')[:limit])
+    if not entries and not Recipe.objects.filter(id=pk).exists():
+        raise Http404
+    serializer = RecipeSerializer([entry.similar for entry in entries], many=True)
+    return Response(serializer.data)
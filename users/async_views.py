@@ -0,0 +1,193 @@
+"""
+Async variants of the password-hashing endpoints for the ASGI app.
+
+PBKDF2 runs on a bounded executor instead of the request worker, and the
+views answer 503 right away when it is saturated. Login runs Django's
+`authenticate()` there, so every authentication backend and the
+`user_login_failed` signal apply. Other database work goes through
+sync_to_async.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import serializers
+from .authentication import CachedJWTAuthentication
+from .hashing import Saturated, get_hashing_executor
+
+User = get_user_model()
+
+
+def csrf_exempt(view):
+    # django.views.decorators.csrf.csrf_exempt hides coroutines in Django 3.2.
+    view.csrf_exempt = True
+    return view
+
+
+def parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+def required_fields(data, *names):
+    """
+    DRF-style errors for missing or non-string fields, or None.
+    """
+    errors = {name: ['This field is required.'] for name in names
+              if not isinstance(data.get(name), str) or not data.get(name)}
+    return errors or None
+
+
+def verify_password(password, encoded):
+    """
+    Check a password and, when the hasher settings changed, rehash it.
+    Runs on the hashing executor.
+    """
+    upgraded = []
+    valid = check_password(password, encoded,
+                           setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+def authenticate_in_worker(email, password):
+    # Backends query the database from a hashing thread; recycle its
+    # connection like a request would.
+    close_old_connections()
+    try:
+        return authenticate(email=email, password=password)
+    finally:
+        close_old_connections()
+
+
+async def hash_or_503(func, *args):
+    try:
+        return await get_hashing_executor().run(func, *args), None
+    except Saturated:
+        response = JsonResponse(
+            {"message": "Too many authentication requests, retry shortly."}, status=503)
+        response['Retry-After'] = '1'
+        return None, response
+
+
+def issue_tokens(user):
+    token = RefreshToken.for_user(user)
+    return {
+        'refresh': str(token),
+        'access': str(token.access_token)
+    }
+
+
+def save_password(user, encoded):
+    user.password = encoded
+    user.save(update_fields=['password'])
+
+
+@csrf_exempt
+async def user_login(request):
+    """
+    Async `user_login`.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"message": "Method not allowed."}, status=405)
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({"message": "Malformed request body."}, status=400)
+    errors = required_fields(data, 'email', 'password')
+    if errors:
+        return JsonResponse(errors, status=400)
+
+    # ModelBackend hashes for unknown emails too and upgrades old hashes.
+    user, busy = await hash_or_503(authenticate_in_worker, data['email'], data['password'])
+    if busy:
+        return busy
+    if user is None or not user.is_active:
+        return JsonResponse({'non_field_errors': ['Incorrect Credentials']}, status=400)
+
+    def respond():
+        body = serializers.CustomUserSerializer(user).data
+        body['tokens'] = issue_tokens(user)
+        return body
+    return JsonResponse(await sync_to_async(respond)(), status=200)
+
+
+@csrf_exempt
+async def user_registration(request):
+    """
+    Async `user_registration`.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"message": "Method not allowed."}, status=405)
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({"message": "Malformed request body."}, status=400)
+
+    serializer = serializers.UserRegisterationSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    encoded, busy = await hash_or_503(make_password, serializer.validated_data['password'])
+    if busy:
+        return busy
+
+    def create():
+        fields = dict(serializer.validated_data)
+        fields.pop('password')
+        email = User.objects.normalize_email(fields.pop('email'))
+        user = User.objects.create(email=email, password=encoded, **fields)
+        body = serializers.UserRegisterationSerializer(user).data
+        body['tokens'] = issue_tokens(user)
+        return body
+    return JsonResponse(await sync_to_async(create)(), status=201)
+
+
+@csrf_exempt
+async def password_change(request):
+    """
+    Async `password_change`.
+    """
+    if request.method != 'PUT':
+        return JsonResponse({"message": "Method not allowed."}, status=405)
+    try:
+        authenticated = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except APIException as error:
+        detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+        return JsonResponse(detail, status=error.status_code)
+    if authenticated is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=401)
+    user = authenticated[0]
+
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({"message": "Malformed request body."}, status=400)
+    errors = required_fields(data, 'old_password', 'new_password')
+    if errors:
+        return JsonResponse(errors, status=400)
+
+    result, busy = await hash_or_503(verify_password, data['old_password'], user.password)
+    if busy:
+        return busy
+    if not result[0]:
+        return JsonResponse({'old_password': ['Invalid old password.']}, status=400)
+    try:
+        await sync_to_async(validate_password)(data['new_password'], user)
+    except ValidationError as error:
+        return JsonResponse({'new_password': list(error.messages)}, status=400)
+
+    encoded, busy = await hash_or_503(make_password, data['new_password'])
+    if busy:
+        return busy
+    await sync_to_async(save_password)(user, encoded)
+    return JsonResponse({"message": "Password changed."}, status=200)
@@ -0,0 +1,147 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'users:auth:%s'
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    # Seconds a cached user is trusted. Saves invalidate the entry at once in
+    # this process, and in all of them when ALIAS names a shared cache.
+    'TTL': 60,
+    'ALIAS': None,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class LocalUserCache:
+    """
+    Bounded in-process LRU of pickled users with a time to live.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return data
+
+    def set(self, user_id, data):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, data)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedUserCache:
+    """
+    Pickled users in a Django cache shared by every process.
+    """
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, user_id):
+        return self.cache.get(USER_KEY % user_id)
+
+    def set(self, user_id, data):
+        self.cache.set(USER_KEY % user_id, data, self.ttl)
+
+    def delete(self, user_id):
+        self.cache.delete(USER_KEY % user_id)
+
+    def clear(self):
+        pass
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _user_cache
+    with _user_cache_lock:
+        if _user_cache is None:
+            config = get_config()
+            if config['ALIAS']:
+                _user_cache = SharedUserCache(config['ALIAS'], config['TTL'])
+            else:
+                _user_cache = LocalUserCache(config['MAX_SIZE'], config['TTL'])
+        return _user_cache
+
+
+def invalidate_user(user_id):
+    """
+    Drop a cached user; call it after writes that bypass `save()`.
+    """
+    get_user_cache().delete(user_id)
+    # Again after commit: a request may have cached the old row meanwhile.
+    transaction.on_commit(partial(get_user_cache().delete, user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user, with its profile,
+    from a cache instead of querying on every request.
+
+    Each hit unpickles a fresh copy, so a view modifying `request.user`
+    never leaks into other requests.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        cache = get_user_cache()
+        data = cache.get(user_id)
+        if data is not None:
+            user = pickle.loads(data)
+        else:
+            User = get_user_model()
+            try:
+                user = User.objects.select_related('profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(user_id, pickle.dumps(user, pickle.HIGHEST_PROTOCOL))
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import threading
+import time
+from functools import partial
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from recipe.cache import is_shared
+
+# Bumped after every blacklist write, so other processes load new rows.
+GENERATION_KEY = 'users:blacklist:generation'
+# Bumped after pruning, so other processes rebuild their filter from scratch.
+EPOCH_KEY = 'users:blacklist:epoch'
+
+ERROR_RATE = 0.001
+MIN_CAPACITY = 10000
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and about `error_rate` false
+    positives while holding at most `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self.positions(item))
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted `jti`s, built on first use and
+    kept current through counters in the default cache.
+
+    Entries written by other processes only arrive through a shared cache;
+    with a process-local one, every lookup goes to the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.last_id = 0
+        self.generation = None
+        self.epoch = None
+
+    def rebuild(self):
+        count = BlacklistedToken.objects.count()
+        self.bloom = BloomFilter(max(MIN_CAPACITY, count * 2))
+        self.last_id = 0
+        self.load()
+
+    def load(self):
+        rows = (BlacklistedToken.objects.filter(id__gt=self.last_id).order_by('id')
+                .values_list('id', 'token__jti'))
+        for blacklisted_id, jti in rows.iterator():
+            self.bloom.add(jti)
+            self.last_id = blacklisted_id
+
+    def sync(self):
+        found = cache.get_many([GENERATION_KEY, EPOCH_KEY])
+        generation, epoch = found.get(GENERATION_KEY), found.get(EPOCH_KEY)
+        with self.lock:
+            if self.bloom is None or epoch != self.epoch:
+                self.rebuild()
+            elif generation != self.generation:
+                self.load()
+                if self.bloom.count > self.bloom.capacity:
+                    self.rebuild()
+            self.generation, self.epoch = generation, epoch
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def might_contain(self, jti):
+        if not is_shared(DEFAULT_CACHE_ALIAS):
+            return True
+        self.sync()
+        return jti in self.bloom
+
+
+_filter = BlacklistFilter()
+
+
+def get_blacklist_filter():
+    return _filter
+
+
+def bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Seed from the clock so an evicted counter never repeats a value.
+        cache.set(key, time.time_ns(), None)
+
+
+def blacklisted(jti):
+    """
+    Record a new blacklist entry here now, and everywhere once committed.
+    """
+    get_blacklist_filter().add(jti)
+    transaction.on_commit(partial(bump, GENERATION_KEY))
+
+
+def pruned():
+    transaction.on_commit(partial(bump, EPOCH_KEY))
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check queries the database only when the
+    Bloom filter reports a possible hit.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if not get_blacklist_filter().might_contain(jti):
+            return
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_('Token is blacklisted'))
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+DEFAULTS = {
+    'WORKERS': 4,
+    # Hashes allowed to wait for a worker before new ones are refused.
+    'QUEUE_DEPTH': 32,
+}
+
+
+class Saturated(Exception):
+    """
+    Raised instead of queueing when every worker and queue slot is taken.
+    """
+
+
+class HashingExecutor:
+    """
+    Thread pool for password hashing with a bounded queue. hashlib releases
+    the GIL while hashing, so the workers run in parallel and the event
+    loop stays free.
+    """
+
+    def __init__(self, workers, queue_depth):
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    async def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise Saturated
+        future = self.executor.submit(func, *args)
+        # Free the slot when the hash finishes, even if the caller went away.
+        future.add_done_callback(lambda _: self.slots.release())
+        return await asyncio.wrap_future(future)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hashing_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING_EXECUTOR', {})}
+            _executor = HashingExecutor(config['WORKERS'], config['QUEUE_DEPTH'])
+        return _executor
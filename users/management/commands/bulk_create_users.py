@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from users.models import Profile
+
+User = get_user_model()
+
+LOOKUP_CHUNK = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Bulk create users and their profiles from CSV or JSONL. Rows need '
+            'email and username, and may carry password, first_name, last_name '
+            'and bio; users without a password cannot log in until they reset '
+            'it. Existing emails and usernames are skipped, so an interrupted '
+            'run can simply be repeated.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Input format; guessed from the extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users inserted per transaction.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords; 1 hashes in this process.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate the file without hashing or writing anything.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('File "%s" does not exist.' % path)
+        self.format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        pool = None
+        if options['workers'] > 1 and not options['dry_run']:
+            # Spawned workers need the app registry for the hasher settings.
+            pool = ProcessPoolExecutor(options['workers'], initializer=django.setup)
+        created = invalid = existing = 0
+        started = time.monotonic()
+        try:
+            rows = self.read_rows(path)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+
+                valid, seen = [], set()
+                for line, row in batch:
+                    try:
+                        fields = self.clean_row(row, seen)
+                    except RowError as error:
+                        invalid += 1
+                        self.stderr.write('Row %d skipped: %s' % (line, error))
+                        continue
+                    valid.append(fields)
+                fields = self.drop_existing(valid)
+                existing += len(valid) - len(fields)
+
+                if fields and not options['dry_run']:
+                    self.insert(fields, pool, options['workers'])
+                created += len(fields)
+                elapsed = time.monotonic() - started
+                self.stdout.write('%d users, %.0f users/sec' % (
+                    created, created / elapsed if elapsed else 0))
+        finally:
+            if pool:
+                pool.shutdown()
+
+        verb = 'validated' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            '%d users %s, %d already existed, %d rows skipped.' % (
+                created, verb, existing, invalid)))
+
+    def read_rows(self, path):
+        with open(path, newline='', encoding='utf-8') as handle:
+            if self.format == 'csv':
+                rows = csv.DictReader(handle)
+            else:
+                rows = (json.loads(line) for line in handle if line.strip())
+            yield from enumerate(rows, 1)
+
+    def clean_row(self, row, seen):
+        """
+        Validated field values of one row; `seen` catches duplicates within
+        the batch.
+        """
+        values = {}
+        for field in ('email', 'username', 'first_name', 'last_name'):
+            value = (row.get(field) or '').strip()
+            max_length = User._meta.get_field(field).max_length
+            if len(value) > max_length:
+                raise RowError('"%s" is longer than %d characters.' % (field, max_length))
+            values[field] = value
+        for field in ('email', 'username'):
+            if not values[field]:
+                raise RowError('"%s" is required.' % field)
+        values['email'] = User.objects.normalize_email(values['email'])
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            raise RowError('"%s" is not a valid email.' % values['email'])
+        try:
+            User.username_validator(values['username'])
+        except ValidationError:
+            raise RowError('"%s" is not a valid username.' % values['username'])
+        for key in (('email', values['email'].lower()), ('username', values['username'])):
+            if key in seen:
+                raise RowError('Duplicate %s "%s".' % key)
+            seen.add(key)
+
+        values['bio'] = (row.get('bio') or '').strip()
+        if len(values['bio']) > Profile._meta.get_field('bio').max_length:
+            raise RowError('"bio" is too long.')
+        values['password'] = row.get('password') or None
+        return values
+
+    def drop_existing(self, rows):
+        emails, usernames = set(), set()
+        for chunk in chunked(rows, LOOKUP_CHUNK):
+            taken = User.objects.filter(email__in=[row['email'] for row in chunk])
+            emails.update(email.lower() for email in taken.values_list('email', flat=True))
+            taken = User.objects.filter(username__in=[row['username'] for row in chunk])
+            usernames.update(taken.values_list('username', flat=True))
+        return [row for row in rows
+                if row['email'].lower() not in emails and row['username'] not in usernames]
+
+    def insert(self, rows, pool, workers):
+        """
+        Hash the passwords of one batch, then insert the users and their
+        profiles in one transaction. bulk_create sends no post_save, so the
+        profiles are created here rather than by the signal.
+        """
+        passwords = [row.pop('password') for row in rows]
+        if pool:
+            chunksize = max(1, len(passwords) // (workers * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = [make_password(password) for password in passwords]
+        bios = {row['email']: row.pop('bio') for row in rows}
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(password=encoded, **row) for row, encoded in zip(rows, hashes)])
+            # MySQL does not return the new ids, so read them back.
+            profiles = []
+            for chunk in chunked(list(bios), LOOKUP_CHUNK):
+                for user_id, email in User.objects.filter(email__in=chunk).values_list(
+                        'id', 'email'):
+                    profiles.append(Profile(user_id=user_id, bio=bios[email]))
+            Profile.objects.bulk_create(profiles)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,89 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def recount_bookmarks(apps):
+    """
+    Set `Recipe.bookmark_count` from the RecipeBookmark rows, with the
+    correlated COUNT of `RecipeQuerySet.live_count_expressions()`.
+    """
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeBookmark = apps.get_model('recipe', 'RecipeBookmark')
+    counts = RecipeBookmark.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe').annotate(total=Count('*')).values('total')[:1]
+    recipe_ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(recipe_ids.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        Recipe.objects.filter(id__gte=batch[0], id__lte=batch[-1]).update(
+            bookmark_count=Coalesce(Subquery(counts), 0))
+        last_id = batch[-1]
+
+
+def copy_bookmarks(apps, schema_editor):
+    """
+    Move bookmarks from the profile through table to RecipeBookmark. Their
+    save time was never stored; the recipe's creation is the closest known
+    bound, and keeps old bookmarks from looking fresh to trending.
+    """
+    Profile = apps.get_model('users', 'Profile')
+    RecipeBookmark = apps.get_model('recipe', 'RecipeBookmark')
+    rows = Profile.bookmarks.through.objects.order_by('id')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).values_list(
+            'id', 'profile__user_id', 'recipe_id', 'recipe__created_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        RecipeBookmark.objects.bulk_create([
+            RecipeBookmark(user_id=user_id, recipe_id=recipe_id, created=created)
+            for _, user_id, recipe_id, created in batch], ignore_conflicts=True)
+        last_id = batch[-1][0]
+    # Merging the two tables changes the counts; count them again.
+    recount_bookmarks(apps)
+
+
+def restore_bookmarks(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    RecipeBookmark = apps.get_model('recipe', 'RecipeBookmark')
+    Through = Profile.bookmarks.through
+    rows = RecipeBookmark.objects.order_by('id')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).values_list(
+            'id', 'user__profile__id', 'recipe_id')[:BATCH_SIZE])
+        if not batch:
+            break
+        Through.objects.bulk_create([
+            Through(profile_id=profile_id, recipe_id=recipe_id)
+            for _, profile_id, recipe_id in batch if profile_id is not None],
+            ignore_conflicts=True)
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0013_recipebookmark_constraints'),
+        ('users', '0003_profile_avatar_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='bookmarks',
+            field=models.ManyToManyField(related_name='bookmarked_by', through='recipe.RecipeBookmark', to='recipe.Recipe'),
+        ),
+        migrations.RunPython(copy_bookmarks, restore_bookmarks),
+        migrations.RemoveField(
+            model_name='profile',
+            name='bookmarks',
+        ),
+    ]
@@ -4,15 +4,19 @@ from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
 # Create your models here.
-from recipe.models import Recipe
+from recipe.images import READY, STATUS_CHOICES
+from recipe.models import LoadedValuesMixin, Recipe
 from .managers import CustomUserManager
 
 
-class CustomUser(AbstractUser):
+class CustomUser(LoadedValuesMixin, AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    bookmarks = models.ManyToManyField(
+        Recipe, through='recipe.RecipeBookmark', related_name='bookmarked_by')
+
     objects = CustomUserManager()
 
     def __str__(self):
@@ -21,8 +25,10 @@ class CustomUser(AbstractUser):
 class Profile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    bookmarks = models.ManyToManyField(Recipe, related_name='bookmarked_by')
     avatar = models.ImageField(upload_to='avatar', blank=True)
+    avatar_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=READY, editable=False)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.CharField(max_length=200, blank=True)
 
     def __str__(self):
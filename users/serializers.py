@@ -1,7 +1,12 @@
 from rest_framework import serializers
+from rest_framework.utils import model_meta
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
+from recipe.images import accept_image, variant_urls
+from .blacklist import FilteredRefreshToken
 from .models import CustomUser, Profile
 
 
@@ -29,16 +34,68 @@ class UserLoginSerializer(serializers.Serializer):
             return user
         raise serializers.ValidationError('Incorrect Credentials')
     
-class ProfileSerializer(CustomUserSerializer):
+class ValidatedFieldsUpdateMixin:
+    """
+    Write only the validated fields, so columns changed elsewhere since the
+    instance was loaded, such as avatars set by the image job or a user's
+    deactivation, survive the save.
+    """
+
+    def update(self, instance, validated_data):
+        relations = model_meta.get_field_info(instance).relations
+        many = {field: validated_data.pop(field) for field in list(validated_data)
+                if field in relations and relations[field].to_many}
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        for field, value in many.items():
+            getattr(instance, field).set(value)
+        return instance
+
+class CustomUserUpdateSerializer(ValidatedFieldsUpdateMixin, CustomUserSerializer):
+    pass
+
+class ProfileSerializer(ValidatedFieldsUpdateMixin, CustomUserSerializer):
+    # Changed through the bookmarks endpoint, which keeps the counters.
+    bookmarks = serializers.PrimaryKeyRelatedField(
+        source='user.bookmarks', many=True, read_only=True)
 
     class Meta:
         model = Profile
         fields = ('bookmarks', 'bio')
 
-class ProfileAvatarSerializer(serializers.ModelSerializer):
+class BookmarkIdsSerializer(serializers.Serializer):
+    """
+    Recipe ids to bookmark or unbookmark, as `ids` or a single `id`.
+    """
+    id = serializers.IntegerField(min_value=1, required=False)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                required=False, max_length=1000)
+
+    def validate(self, data):
+        ids = set(data.get('ids', []))
+        if 'id' in data:
+            ids.add(data['id'])
+        if not ids:
+            raise serializers.ValidationError('Provide "id" or "ids".')
+        return sorted(ids)
+
+class ProfileAvatarSerializer(ValidatedFieldsUpdateMixin, serializers.ModelSerializer):
+    avatar_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_status', 'avatar_variants')
+
+    def get_avatar_variants(self, obj):
+        return variant_urls(obj, 'avatar')
+
+    def update(self, instance, validated_data):
+        avatar = validated_data.pop('avatar', None)
+        instance = super().update(instance, validated_data)
+        if avatar:
+            accept_image(instance, 'avatar', avatar)
+        return instance
 
 class PasswordChangeSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
@@ -55,6 +112,30 @@ class PasswordChangeSerializer(serializers.Serializer):
         return value
 
     def save(self):
+        # request.user may be a cached copy; write the password alone.
         user = self.context['request'].user
         user.set_password(self.validated_data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer checking the blacklist through the Bloom filter.
+    """
+
+    def validate(self, attrs):
+        refresh = FilteredRefreshToken(attrs['refresh'])
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,7 +1,15 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 
+from recipe import cache as response_cache
+from recipe import feed, trending
+from recipe.images import image_processed
+from recipe.models import Recipe, RecipeBookmark
+from recipe.signals import invalidate_recipes
+from .authentication import invalidate_user
+from .blacklist import blacklisted
 from .models import Profile
 
 User = get_user_model()
@@ -9,10 +17,82 @@ User = get_user_model()
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
-    if created:
+    # Profiles are saved on their own when edited; a user save leaves them be.
+    if created and not kwargs['raw']:
         Profile.objects.create(user=instance)
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def invalidate_author_responses(sender, instance, created, update_fields=None, **kwargs):
+    # Usernames are rendered into every recipe of the author; nothing else
+    # of the user is.
+    if not created and instance.has_changed('username', update_fields):
+        response_cache.bump(response_cache.CATALOG)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers profile edits, password changes and deactivation.
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(image_processed, sender=Profile)
+def invalidate_processed_avatar(sender, pk, **kwargs):
+    user_id = Profile.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_user(user_id)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def update_blacklist_filter(sender, instance, created, **kwargs):
+    if created:
+        blacklisted(instance.token.jti)
+
+
+@receiver(m2m_changed, sender=RecipeBookmark)
+def remember_removed_bookmarks(sender, instance, action, reverse, pk_set, **kwargs):
+    # The rows are gone by post_remove; their trending scores are retracted
+    # at the time they were created.
+    if action == 'pre_remove':
+        rows = RecipeBookmark.objects.filter(**(
+            {'recipe': instance, 'user_id__in': pk_set} if isinstance(instance, Recipe)
+            else {'user': instance, 'recipe_id__in': pk_set}))
+        instance._removed_bookmarks = list(rows.values_list('recipe_id', 'created'))
+
+
+@receiver(m2m_changed, sender=RecipeBookmark)
+def invalidate_bookmark_responses(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear':
+        # clear() does not report which rows went away; drop everything.
+        response_cache.bump(response_cache.CATALOG)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    if isinstance(instance, Recipe):
+        recipe_ids = [instance.id]
+        user_ids = list(pk_set)
+    else:
+        recipe_ids = list(pk_set)
+        user_ids = [instance.id]
+    removed = instance.__dict__.pop('_removed_bookmarks', [])
+    if action == 'post_add' and isinstance(instance, Recipe):
+        trending.record(instance.id, 'bookmark', len(user_ids))
+    elif action == 'post_add':
+        trending.record_many(recipe_ids, 'bookmark')
+    elif isinstance(instance, Recipe):
+        for recipe_id, created in removed:
+            trending.record(recipe_id, 'bookmark', -1, at=created.timestamp())
+    else:
+        # One user bookmarks a recipe at most once.
+        created = {recipe_id: created.timestamp() for recipe_id, created in removed}
+        trending.record_many(created, 'bookmark', -1, at=created)
+    invalidate_recipes(recipe_ids)
+    feed.mark_dirty(user_ids)
+    response_cache.bump(*[response_cache.bookmarks_scope(user_id) for user_id in user_ids])
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Profile
+
+from . import authentication, blacklist, hashing
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        authentication.get_user_cache().clear()
+        self.user = User.objects.create_user(
+            email='rana@example.com', password='pass1234', username='rana')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % token)
+        self.url = reverse('users:user-avatar')
+
+    def test_warm_cache_needs_no_queries(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_profile_save_invalidates(self):
+        self.client.get(self.url)
+        self.user.profile.bio = 'Cooks on Fridays'
+        self.user.profile.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(len(queries), 1)
+
+    def test_profile_update_keeps_processed_avatar(self):
+        self.client.get(self.url)
+        # The image job writes with update(), leaving the cached profile stale.
+        Profile.objects.filter(user=self.user).update(avatar_variants={'thumb': {}})
+        response = self.client.put(reverse('users:user-profile'), {'bio': 'Cooks on Fridays'})
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.bio, 'Cooks on Fridays')
+        self.assertEqual(profile.avatar_variants, {'thumb': {}})
+
+    def test_password_change_keeps_changes_made_elsewhere(self):
+        self.client.get(self.url)
+        # Another worker deactivates the user; this one still has it cached.
+        User.objects.filter(id=self.user.id).update(is_active=False, first_name='Rana')
+        response = self.client.put(reverse('users:change-password'),
+                                   {'old_password': 'pass1234', 'new_password': 'a-Longer-pass-99'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.first_name, 'Rana')
+        self.assertTrue(self.user.check_password('a-Longer-pass-99'))
+
+    def test_user_update_keeps_changes_made_elsewhere(self):
+        self.client.get(self.url)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.client.put(reverse('users:user-info'), {'first_name': 'Rana'})
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.first_name, 'Rana')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_password_change_invalidates(self):
+        self.client.put(reverse('users:change-password'),
+                        {'old_password': 'pass1234', 'new_password': 'a-Longer-pass-99'})
+        cached = authentication.get_user_cache().get(self.user.id)
+        self.assertIsNone(cached)
+
+
+class TokenBlacklistFilterTests(APITestCase):
+
+    def setUp(self):
+        # A file cache is shared between processes like memcached is.
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.directory.name,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        cache.clear()
+        blacklist.get_blacklist_filter().bloom = None
+        self.user = User.objects.create_user(
+            email='rana@example.com', password='pass1234', username='rana')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.url = reverse('users:token-refresh')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = blacklist.BloomFilter(1000)
+        for number in range(1000):
+            bloom.add('jti-%d' % number)
+        self.assertTrue(all('jti-%d' % number in bloom for number in range(1000)))
+        false_positives = sum('other-%d' % number in bloom for number in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_rotated_token_is_rejected(self):
+        response = self.client.post(self.url, {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            rotated = self.client.post(self.url, {'refresh': response.data['refresh']})
+        self.assertEqual(rotated.status_code, 200)
+        # Only the blacklisting writes; the lookup is answered by the filter.
+        lookups = [query['sql'] for query in queries.captured_queries
+                   if 'FROM "token_blacklist_blacklistedtoken" INNER JOIN' in query['sql']
+                   and '."jti" =' in query['sql']]
+        self.assertEqual(lookups, [])
+        self.assertEqual(self.client.post(self.url, {'refresh': str(self.refresh)}).status_code, 401)
+
+    def blacklist_elsewhere(self):
+        """
+        Blacklist the token the way another process would: this process's
+        filter sees neither the signal nor the local add.
+        """
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(
+            token=OutstandingToken.objects.get(jti=self.refresh['jti']))])
+
+    def test_other_process_picks_up_new_entries(self):
+        self.assertFalse(blacklist.get_blacklist_filter().might_contain('x'))
+        self.blacklist_elsewhere()
+        # The other process bumps the generation in the shared cache.
+        FileBasedCache(self.directory.name, {}).set(blacklist.GENERATION_KEY, 1, None)
+        self.assertEqual(self.client.post(self.url, {'refresh': str(self.refresh)}).status_code, 401)
+
+    def test_local_cache_falls_back_to_database(self):
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertTrue(blacklist.get_blacklist_filter().might_contain('x'))
+            self.blacklist_elsewhere()
+            response = self.client.post(self.url, {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_prune_deletes_expired_tokens(self):
+        self.refresh.blacklist()
+        OutstandingToken.objects.update(expires_at=timezone.now() - datetime.timedelta(days=1))
+        RefreshToken.for_user(self.user)
+        out = StringIO()
+        call_command('prune_jwt_tokens', batch_size=1, stdout=out)
+        self.assertIn('Deleted 1 expired tokens, 1 of them blacklisted', out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+
+class AsyncPasswordViewsTests(APITransactionTestCase):
+    # Login queries the database from hashing threads, which only see
+    # committed rows.
+
+    def setUp(self):
+        authentication.get_user_cache().clear()
+        self.user = User.objects.create_user(
+            email='rana@example.com', password='pass1234', username='rana')
+
+    def tearDown(self):
+        hashing._executor = None
+
+    def test_login(self):
+        response = self.client.post(reverse('users:async-login-user'),
+                                    {'email': 'rana@example.com', 'password': 'pass1234'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json()['tokens'])
+        failures = []
+
+        def receiver(sender, credentials, **kwargs):
+            failures.append(credentials)
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        response = self.client.post(reverse('users:async-login-user'),
+                                    {'email': 'rana@example.com', 'password': 'wrong'},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(failures[0]['email'], 'rana@example.com')
+
+    def test_registration(self):
+        response = self.client.post(reverse('users:async-create-user'), {
+            'email': 'mitu@example.com', 'username': 'mitu', 'password': 'a-Longer-pass-99',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(email='mitu@example.com')
+                        .check_password('a-Longer-pass-99'))
+
+    def test_password_change(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.put(
+            reverse('users:async-change-password'),
+            {'old_password': 'pass1234', 'new_password': 'a-Longer-pass-99'},
+            format='json', HTTP_AUTHORIZATION='Bearer %s' % token)
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('a-Longer-pass-99'))
+
+    def test_saturated_executor_answers_503(self):
+        hashing._executor = hashing.HashingExecutor(workers=1, queue_depth=0)
+        release = threading.Event()
+        hashing._executor.slots.acquire()
+        hashing._executor.executor.submit(release.wait)
+        try:
+            response = self.client.post(reverse('users:async-login-user'),
+                                        {'email': 'rana@example.com', 'password': 'pass1234'},
+                                        format='json')
+        finally:
+            release.set()
+            hashing._executor.slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class ProfileSignalTests(APITestCase):
+
+    def test_user_save_leaves_profile_alone(self):
+        user = User.objects.create_user(
+            email='rana@example.com', password='pass1234', username='rana')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        with CaptureQueriesContext(connection) as queries:
+            user.first_name = 'Rana'
+            user.save()
+        self.assertFalse(any('users_profile' in query['sql'] for query in queries))
+
+
+class BulkCreateUsersTests(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        User.objects.create_user(email='rana@example.com', password='pass1234', username='rana')
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.directory.name, 'users.jsonl')
+        with open(path, 'w') as handle:
+            handle.writelines(json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def test_creates_users_and_profiles(self):
+        path = self.write_jsonl([
+            {'email': 'mitu@example.com', 'username': 'mitu', 'password': 'pass1234',
+             'bio': 'Partner kitchen'},
+            {'email': 'tuli@example.com', 'username': 'tuli'},
+            {'email': 'rana@example.com', 'username': 'rana2'},
+            {'email': 'not-an-email', 'username': 'broken'},
+            {'email': 'MITU@example.com', 'username': 'mitu3'},
+        ])
+        out, err = StringIO(), StringIO()
+        call_command('bulk_create_users', path, workers=2, batch_size=10,
+                     stdout=out, stderr=err)
+        self.assertIn('2 users created, 1 already existed, 2 rows skipped', out.getvalue())
+        self.assertIn('Row 5 skipped: Duplicate email', err.getvalue())
+        mitu = User.objects.get(username='mitu')
+        self.assertTrue(mitu.check_password('pass1234'))
+        self.assertEqual(mitu.profile.bio, 'Partner kitchen')
+        self.assertFalse(User.objects.get(username='tuli').has_usable_password())
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_jsonl([{'email': 'mitu@example.com', 'username': 'mitu'}])
+        call_command('bulk_create_users', path, dry_run=True, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='mitu').exists())
@@ -1,12 +1,11 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-from . import views
+from . import async_views, views
 app_name = 'users'
 urlpatterns = [
     path('register/', views.user_registration,
          name="create-user"),
     path('login/', views.user_login, name="login-user"),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/refresh/', views.FilteredTokenRefreshView.as_view(), name='token-refresh'),
     path('logout/', views.user_logout, name='logout-user'),
     path('', views.user_profile, name='user-info'),
     path('profile/', views.user_profile_update,
@@ -17,4 +16,10 @@ urlpatterns = [
          name='user-bookmark'),
     path('password/change/', views.password_change,
          name='change-password'),
+    # Hash passwords off the event loop when served by the ASGI app.
+    path('async/register/', async_views.user_registration,
+         name='async-create-user'),
+    path('async/login/', async_views.user_login, name='async-login-user'),
+    path('async/password/change/', async_views.password_change,
+         name='async-change-password'),
 ]
@@ -3,13 +3,20 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_datetime
 
-from recipe.models import Recipe
-from .models import Profile
+from recipe import cache as response_cache
+from recipe.models import Recipe, RecipeBookmark
+from recipe.pagination import BookmarkPagination
+from .authentication import invalidate_user
+from .blacklist import FilteredRefreshToken
 from recipe.serializers import RecipeSerializer
 from . import serializers
+from .models import Profile
 User = get_user_model()
 
 
@@ -50,6 +57,13 @@ def user_login(request):
     return Response(data, status=status.HTTP_200_OK)
 
 
+class FilteredTokenRefreshView(TokenRefreshView):
+    """
+    Refresh an access token, checking the blacklist through the Bloom filter.
+    """
+    serializer_class = serializers.FilteredTokenRefreshSerializer
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def user_logout(request):
@@ -58,7 +72,7 @@ def user_logout(request):
     """
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
+        token = FilteredRefreshToken(refresh_token)
         token.blacklist()
         return Response(status=status.HTTP_205_RESET_CONTENT)
     except Exception as e:
@@ -76,7 +90,9 @@ def user_profile(request):
         serializer = serializers.CustomUserSerializer(user)
         return Response(serializer.data)
     elif request.method == 'PUT':
-        serializer = serializers.CustomUserSerializer(user, data=request.data, partial=True)
+        # request.user may come from the auth cache; write to a fresh row.
+        user = get_object_or_404(User, pk=request.user.pk)
+        serializer = serializers.CustomUserUpdateSerializer(user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
@@ -94,6 +110,8 @@ def user_profile_update(request):
         print(serializer.data)
         return Response(serializer.data)
     elif request.method == 'PUT':
+        # request.user may come from the auth cache; write to a fresh row.
+        profile = get_object_or_404(Profile, user_id=request.user.id)
         serializer = serializers.ProfileSerializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -111,56 +129,84 @@ def user_avatar(request):
         serializer = serializers.ProfileAvatarSerializer(profile)
         return Response(serializer.data)
     elif request.method == 'PUT':
+        profile = get_object_or_404(Profile, user_id=request.user.id)
         serializer = serializers.ProfileAvatarSerializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        # accept_image marks the avatar pending without a save() signal.
+        invalidate_user(request.user.id)
         return Response(serializer.data)
 
 
+def user_bookmarks_scopes(request, pk):
+    return [response_cache.CATALOG, response_cache.LIST, response_cache.bookmarks_scope(pk)]
+
+
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@response_cache.conditional_response(user_bookmarks_scopes)
 def user_bookmarks(request, pk):
     """
-    Get, Create, Delete favorite recipe
-    """
-    profile = Profile.objects.all()
+    Get, add or remove bookmarked recipes, recently saved first.
 
+    POST and DELETE take a list of recipe `ids` (or a single `id`) and
+    return the resulting `bookmark_count`. GET takes `since` to list only
+    bookmarks saved after it, and `cursor` or `page_size` to switch to
+    keyset pagination.
+    """
     if request.method == 'GET':
-        user = User.objects.get(id=pk)
-
-        user_profile = get_object_or_404(profile, user=user)
-        print(user_profile)
-        serializer = RecipeSerializer(user_profile.bookmarks.all(), many=True)
-        print(serializer)
-        print(user_profile.bookmarks)
+        get_object_or_404(User.objects.only('id'), id=pk)
+        fields = RecipeSerializer.get_requested_fields(request)
+        conditions = {'user_id': pk}
+        if 'since' in request.GET:
+            since = parse_datetime(request.GET['since'])
+            if since is None:
+                return Response({"message": "Invalid since."}, status=status.HTTP_400_BAD_REQUEST)
+            conditions['created__gt'] = since
+        bookmarks = RecipeBookmark.objects.filter(**conditions)
+
+        paginator = BookmarkPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(bookmarks.only('created', 'recipe_id'), request)
+            recipes = RecipeSerializer.restrict_queryset(
+                Recipe.objects.filter(id__in=[bookmark.recipe_id for bookmark in page]), fields)
+            recipes = {recipe.id: recipe for recipe in recipes}
+            serializer = RecipeSerializer(
+                [recipes[bookmark.recipe_id] for bookmark in page if bookmark.recipe_id in recipes],
+                many=True, fields=fields)
+            return paginator.get_paginated_response(serializer.data)
+        recipes = RecipeSerializer.restrict_queryset(
+            Recipe.objects.filter(**{'recipebookmark__%s' % name: value
+                                     for name, value in conditions.items()}).order_by(
+                '-recipebookmark__created', '-recipebookmark__id'), fields)
+        serializer = RecipeSerializer(recipes, many=True, fields=fields)
         return Response(serializer.data)
 
-    elif request.method == 'POST':
-        user = User.objects.get(id=pk)
-        print(user)
-        user_profile = get_object_or_404(profile, user=user)
-        print(user_profile)
-        recipe = Recipe.objects.get(id=request.data['id'])
-        print(recipe)
-        if user_profile:
-            user_profile.bookmarks.add(recipe)
-            user_profile.save()
-            recipe.save()
-            return Response(status=status.HTTP_200_OK)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-
-    elif request.method == 'DELETE':
-        user = User.objects.get(id=pk)
-        user_profile = get_object_or_404(profile, user=user)
-        recipe = Recipe.objects.get(id=request.data['id'])
-        if user_profile:
-            user_profile.bookmarks.remove(recipe)
-            return Response(status=status.HTTP_200_OK)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    """
-    API view to get, create, and delete favorite recipes.
-    """
-  
+    serializer = serializers.BookmarkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data
+
+    with transaction.atomic():
+        # Serialize bookmark writes per user so the diff below stays exact.
+        user = get_object_or_404(User.objects.select_for_update().only('id'), id=pk)
+        bookmarked = set(user.bookmarks.filter(id__in=ids).values_list('id', flat=True))
+        if request.method == 'POST':
+            missing = set(ids) - set(Recipe.objects.filter(id__in=ids).values_list('id', flat=True))
+            if missing:
+                return Response(
+                    {"message": "Recipe not found: %s." % ', '.join(map(str, sorted(missing)))},
+                    status=status.HTTP_404_NOT_FOUND)
+            added = [recipe_id for recipe_id in ids if recipe_id not in bookmarked]
+            if added:
+                user.bookmarks.add(*added)
+                Recipe.objects.filter(id__in=added).adjust_counts(bookmarks=1)
+        else:
+            removed = [recipe_id for recipe_id in ids if recipe_id in bookmarked]
+            if removed:
+                user.bookmarks.remove(*removed)
+                Recipe.objects.filter(id__in=removed).adjust_counts(bookmarks=-1)
+        count = user.bookmarks.count()
+    return Response({'bookmark_count': count}, status=status.HTTP_200_OK)
 
 
 @api_view(['PUT'])